@@ -0,0 +1,147 @@
+# -*- coding:utf-8 -*-
+
+# Note: An asyncio version of `TwitterCollector.fetch_recent_tweets` that collects many queries at the same time.
+# It needs `pip install tweepy[async]`. All queries share one connection pool and one rate limit budget, so the
+# collection time is set by the API quota rather than by waiting for one response after the other.
+
+
+import asyncio
+
+import aiohttp
+from tweepy.asynchronous import AsyncClient, AsyncPaginator
+from tweepy import TooManyRequests
+
+from TwitterCollector import TwitterCollector
+from RateLimiter import RateLimitScheduler
+
+
+class ScheduledAsyncClient(AsyncClient):
+    '''An `AsyncClient` whose requests wait for budget in a `RateLimitScheduler`, spread over the scheduler's bearer tokens.'''
+
+    def __init__(self, scheduler, session):
+        super().__init__(bearer_token = scheduler.bearer_tokens[0])
+        self.scheduler = scheduler
+        self.session = session
+        # one client per token, all on the same aiohttp session (connection pool)
+        self._clients = {}
+        for token in scheduler.bearer_tokens:
+            client = AsyncClient(bearer_token = token)
+            client.session = session
+            self._clients[token] = client
+
+    async def request(self, method, route, params = None, json = None, user_auth = False):
+        if user_auth:  # user context requests are not bound to the bearer tokens
+            return await super().request(method, route, params = params, json = json, user_auth = user_auth)
+
+        endpoint = self.scheduler.endpoint(method, route)
+        while True:
+            token = await self.scheduler.acquire_async(endpoint)
+            try:
+                response = await self._clients[token].request(method, route, params = params, json = json)
+            except TooManyRequests as e:
+                # retry on another token, or wait for the reset
+                self.scheduler.update(token, endpoint, e.response.headers, exhausted = True)
+                continue
+            self.scheduler.update(token, endpoint, response.headers)
+            return response
+
+
+class AsyncTwitterCollector():
+    '''Collect recent tweets for many queries concurrently.
+    Use it as an async context manager, so the connection pool is closed at the end:
+
+        async with AsyncTwitterCollector(bearer_token) as atc:
+            results = await atc.fetch_recent_tweets_many(['"BORN PINK" -is:retweet lang:en', 'blackpink lang:en'])
+    '''
+
+    def __init__(self, bearer_token, max_connections = 20, scheduler = None):
+        '''
+        `bearer_token`: the bearer token of your Twitter developer account, or a list of bearer tokens.
+        `max_connections`: the size of the shared connection pool.
+        `scheduler`: a `RateLimitScheduler` to share, e.g. `TwitterCollector(...).scheduler`, so that the synchronous
+                    and the asynchronous collector draw from the same budget. If not specified, a new one is created.
+        '''
+        if isinstance(bearer_token, str):
+            bearer_token = [bearer_token]
+        self.scheduler = scheduler or RateLimitScheduler(bearer_token)
+        self.max_connections = max_connections
+        self.session = None
+        self.client = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.max_connections))
+        self.client = ScheduledAsyncClient(self.scheduler, self.session)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        '''close the connection pool'''
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch_recent_tweets(self, query
+                            , tweets_cnt = 100
+                            , start_time = None
+                            , end_time = None
+                            , save_result = False
+                            , save_dir = None
+                            , file_name = None
+                            , keep_includes = False
+                            , sink = None
+                            ):
+        '''Collecing recent tweets up to 7 days. The arguments are the same as `TwitterCollector.fetch_recent_tweets`,
+        except that the result is not saved unless `save_result` is True.
+        '''
+        if self.client is None:
+            raise RuntimeError('Use AsyncTwitterCollector as "async with AsyncTwitterCollector(...) as atc:"')
+
+        collection = TwitterCollector._new_collection(query, tweets_cnt, sink = sink, keep_includes = keep_includes)
+        pages = AsyncPaginator(self.client.search_recent_tweets, query = query, max_results = 100
+                                , start_time = start_time
+                                , end_time = end_time
+                                , expansions = TwitterCollector.EXPANSIONS
+                                , tweet_fields = TwitterCollector.TWEET_FIELDS
+                                , place_fields = TwitterCollector.PLACE_FIELDS
+                                , user_fields = TwitterCollector.USER_FIELDS
+                                )
+        async for page in pages:
+            TwitterCollector._add_page(collection, page)
+            if collection['tweet_cnt'] >= tweets_cnt:
+                break
+
+        result = TwitterCollector._collection_result(collection)
+        if save_result and sink is None:
+            TwitterCollector._save_result(result, tweets_cnt, save_dir = save_dir, file_name = file_name)
+        return result
+
+    async def fetch_recent_tweets_many(self, queries
+                            , tweets_cnt = 100
+                            , **kwargs
+                            ):
+        '''Collect several queries at the same time.
+        `queries`: a list of search queries.
+        `tweets_cnt`: the number of tweets to be collected per query.
+        The other keyword arguments are passed to `fetch_recent_tweets` (`file_name` and `sink` would be shared, so they are not accepted).
+        Returns a dict with `results` (query -> collection) and `errors` (query -> the exception raised).
+        '''
+        if 'file_name' in kwargs or 'sink' in kwargs:
+            raise ValueError('file_name and sink cannot be shared between queries')
+        queries = list(dict.fromkeys(queries))
+        collections = await asyncio.gather(*[self.fetch_recent_tweets(query, tweets_cnt = tweets_cnt, **kwargs) for query in queries]
+                                        , return_exceptions = True)
+        result = {}
+        result['results'] = {}
+        result['errors'] = {}
+        for query, collection in zip(queries, collections):
+            if isinstance(collection, Exception):
+                result['errors'][query] = collection
+            else:
+                result['results'][query] = collection
+        return result
+
+    def stats(self):
+        '''return the shared rate limit scheduler statistics'''
+        return self.scheduler.stats()
@@ -0,0 +1,181 @@
+# -*- coding:utf-8 -*-
+
+# Note: A small on-disk cache for author (user) meta data, used by `TwitterCollector` before it calls the API.
+# Authors repeat heavily across queries, so most lookups can be answered locally.
+
+
+import json, time, os, sqlite3, threading
+
+
+class AuthorCache():
+    '''SQLite backed cache of user objects keyed by author id.
+    Every field keeps its own fetch time, so fast changing fields (e.g. `public_metrics`) can expire
+    sooner than fields that never change (e.g. `created_at`).
+    '''
+
+    # seconds a field stays fresh, `None` means it never expires
+    DEFAULT_FIELD_TTL = {
+        'id': None,
+        'created_at': None,
+        'username': 7 * 24 * 3600,
+        'name': 7 * 24 * 3600,
+        'description': 7 * 24 * 3600,
+        'location': 7 * 24 * 3600,
+        'verified': 7 * 24 * 3600,
+        'public_metrics': 24 * 3600,
+    }
+
+    def __init__(self, path = 'author_cache.sqlite'
+                    , field_ttl = None
+                    , default_ttl = 24 * 3600
+                    , max_entries = 200000
+                    ):
+        '''
+        `path`: the SQLite file. The directory is created if needed.
+        `field_ttl`: dict of field name -> seconds the field stays fresh (`None` = never expires). Merged into DEFAULT_FIELD_TTL.
+        `default_ttl`: the freshness of fields not listed in `field_ttl`.
+        `max_entries`: the size cap. The least recently used authors are evicted beyond it.
+        '''
+        self.path = path
+        self.field_ttl = dict(self.DEFAULT_FIELD_TTL)
+        if field_ttl:
+            self.field_ttl.update(field_ttl)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+
+        # hit/miss counters, `stale` counts entries found in the cache but too old to be used
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+        save_dir = os.path.dirname(path)
+        if save_dir and not os.path.exists(save_dir):  # make sure the directory exists
+            os.makedirs(save_dir)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread = False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS authors (
+                                id TEXT PRIMARY KEY,
+                                data TEXT NOT NULL,
+                                field_times TEXT NOT NULL,
+                                last_access REAL NOT NULL)''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS authors_last_access ON authors (last_access)')
+        self._conn.commit()
+
+    def _is_fresh(self, field_times, fields, now):
+        '''check whether every requested field is present and within its TTL'''
+        for field in fields:
+            if field not in field_times:
+                return False
+            ttl = self.field_ttl.get(field, self.default_ttl)
+            if ttl is not None and now - field_times[field] > ttl:
+                return False
+        return True
+
+    def get_many(self, author_ids, fields = None):
+        '''Look up many authors at once.
+        `author_ids`: an iterable of author ids.
+        `fields`: the fields the caller needs. If not specified, every cached field of the author must be fresh.
+        Returns a dict of author id -> user data for the fresh hits, and the list of ids that need fetching.
+        '''
+        ids = [str(i) for i in author_ids]
+        now = time.time()
+        found = {}
+        with self._lock:
+            rows = {}
+            # stay below SQLite's limit on the number of bound parameters
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                query = 'SELECT id, data, field_times FROM authors WHERE id IN (%s)' % ','.join('?' * len(chunk))
+                for author_id, data, field_times in self._conn.execute(query, chunk):
+                    rows[author_id] = (data, field_times)
+
+            missing = []
+            for author_id in ids:
+                if author_id not in rows:
+                    self.misses += 1
+                    missing.append(author_id)
+                    continue
+                data, field_times = json.loads(rows[author_id][0]), json.loads(rows[author_id][1])
+                if self._is_fresh(field_times, fields or field_times.keys(), now):
+                    self.hits += 1
+                    found[author_id] = data
+                else:
+                    self.stale += 1
+                    self.misses += 1
+                    missing.append(author_id)
+
+            if found:
+                self._conn.executemany('UPDATE authors SET last_access = ? WHERE id = ?'
+                                        , [(now, author_id) for author_id in found])
+                self._conn.commit()
+        return found, missing
+
+    def get(self, author_id, fields = None):
+        '''Return the cached user data of one author, or None if it is missing or stale.'''
+        found, _ = self.get_many([author_id], fields = fields)
+        return found.get(str(author_id))
+
+    def put_many(self, authors):
+        '''Store user data. Fields are merged into what is already cached, so a partial user object
+        (e.g. from search `includes`) refreshes only the fields it carries.
+        `authors`: an iterable of user data dicts, each with an `id`.
+        '''
+        now = time.time()
+        with self._lock:
+            for author in authors:
+                if not author:
+                    continue
+                author_id = str(author['id'])
+                row = self._conn.execute('SELECT data, field_times FROM authors WHERE id = ?', (author_id,)).fetchone()
+                if row:
+                    data, field_times = json.loads(row[0]), json.loads(row[1])
+                else:
+                    data, field_times = {}, {}
+                data.update(author)
+                for field in author:
+                    field_times[field] = now
+                self._conn.execute('INSERT OR REPLACE INTO authors (id, data, field_times, last_access) VALUES (?, ?, ?, ?)'
+                                    , (author_id, json.dumps(data), json.dumps(field_times), now))
+            self._evict()
+            self._conn.commit()
+
+    def put(self, author):
+        '''Store the user data of one author.'''
+        self.put_many([author])
+
+    def _evict(self):
+        '''drop the least recently used authors beyond `max_entries`'''
+        if not self.max_entries:
+            return
+        size = self._conn.execute('SELECT COUNT(*) FROM authors').fetchone()[0]
+        if size > self.max_entries:
+            overflow = size - self.max_entries
+            self._conn.execute('DELETE FROM authors WHERE id IN (SELECT id FROM authors ORDER BY last_access LIMIT ?)', (overflow,))
+            self.evictions += overflow
+
+    def load_json(self, file_name):
+        '''Seed the cache from a json dump of user objects such as `author_info_list.json`. `None` entries are skipped.'''
+        with open(file_name, encoding = 'utf-8') as f:
+            self.put_many(json.load(f))
+
+    def stats(self):
+        '''return the cache size and hit/miss counters'''
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM authors').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {'size': size
+                , 'hits': self.hits
+                , 'misses': self.misses
+                , 'stale': self.stale
+                , 'evictions': self.evictions
+                , 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return self.stats()['size']
+
+    def close(self):
+        '''close the underlying database'''
+        with self._lock:
+            self._conn.close()
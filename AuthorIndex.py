@@ -0,0 +1,129 @@
+# -*- coding:utf-8 -*-
+
+# Note: An index between the tweets and their authors, built in linear time. The author ids are factorized once,
+# the tweet rows are grouped by author with a stable sort, and the author metadata (`author_info_list`) is joined by
+# id instead of by position. Per-author counts and aggregations are then `np.bincount` / `ufunc.reduceat` calls.
+
+
+import numpy as np
+import pandas as pd
+
+from TweetTable import tweets_to_frame, authors_to_frame
+
+
+class AuthorIndex():
+    '''Tweets grouped by author. The authors are numbered in the order they first appear in the tweets, like
+    `unique_author_list` in the analysis, and every per-author array below follows that order.'''
+
+    def __init__(self, tweets, authors = None):
+        '''
+        `tweets`: a tweet table from `TweetTable`, or the tweet dicts (e.g. `json_data['tweets']`).
+        `authors`: the author metadata, as an author table or user objects (e.g. `author_info_list`). Optional,
+                see `set_authors`.
+        '''
+        self.tweets = tweets if isinstance(tweets, pd.DataFrame) else tweets_to_frame(tweets)
+        # codes[i] is the author number of tweet row i
+        self.codes, self.author_ids = pd.factorize(self.tweets['author_id'].to_numpy())
+        self.author_ids = np.asarray(self.author_ids, dtype = np.int64)
+        self.counts = np.bincount(self.codes, minlength = len(self.author_ids))
+        # the rows of author j are order[offsets[j]:offsets[j + 1]], in their original order
+        self.order = np.argsort(self.codes, kind = 'stable')
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.position = pd.Index(self.author_ids)
+        self.authors = None
+        self.author_rows = None
+        if authors is not None:
+            self.set_authors(authors)
+
+    def __len__(self):
+        return len(self.author_ids)
+
+    def __contains__(self, author_id):
+        return int(author_id) in self.position
+
+    def set_authors(self, authors):
+        '''Attach the author metadata. `authors` is an author table, user objects, or the `authors` dict returned by
+        `TwitterCollector.fetch_authors_info`. `None` entries are skipped, and authors without tweets are ignored.'''
+        if isinstance(authors, dict):
+            authors = authors.values()
+        if not isinstance(authors, pd.DataFrame):
+            authors = authors_to_frame(list(authors))
+        self.authors = authors.drop_duplicates('id').reset_index(drop = True)
+        # author_rows[j] is the row of author j in self.authors, -1 if there is no metadata for it
+        self.author_rows = pd.Index(self.authors['id']).get_indexer(self.author_ids)
+
+    def unique_authors(self):
+        '''the distinct author ids, in order of first appearance'''
+        return self.author_ids
+
+    def rows(self, author_id):
+        '''the tweet row positions of one author, empty if the author has no tweets'''
+        j = self.position.get_indexer([int(author_id)])[0]
+        if j < 0:
+            return np.empty(0, dtype = np.int64)
+        return self.order[self.offsets[j]:self.offsets[j + 1]]
+
+    def tweet_counts(self):
+        '''the number of tweets of each author in the index, as a Series indexed by author id'''
+        return pd.Series(self.counts, index = self.author_ids, name = 'tweets')
+
+    def aggregate(self, values, how = 'sum'):
+        '''Aggregate one value per tweet row (e.g. an engagement score or a sentiment polarity) per author.
+        `values`: an array aligned with the tweet rows, or the name of a column of the tweet table.
+        `how`: 'sum', 'mean', 'max' or 'min'.
+        Returns a Series indexed by author id.
+        '''
+        if isinstance(values, str):
+            values = self.tweets[values].to_numpy()
+        values = np.asarray(values, dtype = np.float64)
+        if len(values) != len(self.codes):
+            raise ValueError('expected one value per tweet')
+        if how == 'sum':
+            result = np.bincount(self.codes, weights = values, minlength = len(self.author_ids))
+        elif how == 'mean':
+            result = np.bincount(self.codes, weights = values, minlength = len(self.author_ids)) / self.counts
+        elif how in ('max', 'min'):
+            ufunc = np.maximum if how == 'max' else np.minimum
+            result = ufunc.reduceat(values[self.order], self.offsets[:-1]) if len(values) else np.empty(0)
+        else:
+            raise ValueError("how must be 'sum', 'mean', 'max' or 'min'")
+        return pd.Series(result, index = self.author_ids, name = how)
+
+    def author(self, author_id):
+        '''the metadata of one author as a dict, None if it is not known'''
+        if self.authors is None:
+            return None
+        j = self.position.get_indexer([int(author_id)])[0]
+        if j < 0 or self.author_rows[j] < 0:
+            return None
+        return self.authors.iloc[self.author_rows[j]].to_dict()
+
+    def missing_ids(self):
+        '''the author ids without metadata, as strings ready for `TwitterCollector.fetch_authors_info`'''
+        if self.authors is None:
+            return [str(i) for i in self.author_ids]
+        return [str(i) for i in self.author_ids[self.author_rows < 0]]
+
+    def author_table(self):
+        '''one row per author with its number of tweets in the index (`tweets`) and, when attached, its metadata'''
+        result = pd.DataFrame({'author_id': self.author_ids, 'tweets': self.counts})
+        if self.authors is not None:
+            known = self.author_rows >= 0
+            metadata = self.authors.drop(columns = 'id').iloc[self.author_rows[known]].reset_index(drop = True)
+            metadata.index = np.flatnonzero(known)
+            result = result.join(metadata)
+        return result
+
+    def join(self, columns = None):
+        '''The tweet table with the author metadata of each tweet. Author columns are prefixed with `author_`.
+        `columns`: the author columns to join, all of them if not specified.'''
+        if self.authors is None:
+            raise ValueError('no author metadata, see set_authors')
+        authors = self.authors.drop(columns = 'id')
+        if columns is not None:
+            authors = authors[list(columns)]
+        rows = self.author_rows[self.codes]
+        known = rows >= 0
+        joined = authors.iloc[rows[known]].add_prefix('author_')
+        joined.index = self.tweets.index[known]
+        return self.tweets.join(joined)
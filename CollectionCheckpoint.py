@@ -0,0 +1,81 @@
+# -*- coding:utf-8 -*-
+
+# Note: Checkpoints let `TwitterCollector.fetch_recent_tweets` resume a long collection from the last completed page
+# instead of starting over and spending the rate limit on pages we already have.
+
+
+import json, time, os
+
+
+class CollectionCheckpoint():
+    '''The state of a paginated collection, saved after each page.
+    `next_token`: the paginator token of the next page to fetch.
+    `newest_id` / `oldest_id`: the range of tweet ids collected so far.
+    `tweet_cnt` / `parts`: the output offset, i.e. how many tweets were written and into which files.
+    '''
+
+    def __init__(self, checkpoint_file, query, start_time = None, end_time = None):
+        '''
+        `checkpoint_file`: the json file holding the checkpoint.
+        `query`, `start_time`, `end_time`: the collection arguments. A checkpoint is only resumed by the same collection.
+        '''
+        self.checkpoint_file = checkpoint_file
+        self.state = {}
+        self.state['query'] = query
+        self.state['start_time'] = start_time.isoformat() if start_time else None
+        self.state['end_time'] = end_time.isoformat() if end_time else None
+        self.state['next_token'] = None
+        self.state['newest_id'] = None
+        self.state['oldest_id'] = None
+        self.state['tweet_cnt'] = 0
+        self.state['parts'] = []
+        self.state['pages'] = 0
+        self.state['status'] = 'new'
+
+        self.resumed = False
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file, encoding = 'utf-8') as f:
+                saved = json.load(f)
+            # a checkpoint of a different collection is ignored and will be overwritten
+            if all(saved.get(k) == self.state[k] for k in ('query', 'start_time', 'end_time')):
+                self.state.update(saved)
+                self.resumed = saved.get('status') in ('running', 'complete')
+
+    @property
+    def next_token(self):
+        return self.state['next_token']
+
+    @property
+    def complete(self):
+        return self.state['status'] == 'complete'
+
+    def update(self, page_tweets, next_token, tweet_cnt, parts):
+        '''record a completed page and save the checkpoint
+        `page_tweets`: the tweet dicts of the page that were written.
+        `next_token`: the token of the following page, None if this was the last page.
+        `tweet_cnt`, `parts`: the output offset after the page.
+        '''
+        for tweet in page_tweets:
+            tweet_id = int(tweet['id'])
+            if self.state['newest_id'] is None or tweet_id > int(self.state['newest_id']):
+                self.state['newest_id'] = str(tweet_id)
+            if self.state['oldest_id'] is None or tweet_id < int(self.state['oldest_id']):
+                self.state['oldest_id'] = str(tweet_id)
+        self.state['next_token'] = next_token
+        self.state['tweet_cnt'] = tweet_cnt
+        self.state['parts'] = list(parts)
+        self.state['pages'] += 1
+        self.state['status'] = 'running'
+        self.save()
+
+    def finish(self):
+        '''mark the collection as complete'''
+        self.state['status'] = 'complete'
+        self.save()
+
+    def save(self):
+        self.state['checkpoint_timestamp'] = time.time()
+        # write to a temporary file first so a crash never leaves a broken checkpoint behind
+        with open(self.checkpoint_file + '.tmp', 'w', encoding = 'utf-8') as w:
+            w.write(json.dumps(self.state, indent=4))
+        os.replace(self.checkpoint_file + '.tmp', self.checkpoint_file)
@@ -0,0 +1,107 @@
+# -*- coding:utf-8 -*-
+
+# Note: A local store of the tweets collected for one query. It remembers which time windows were fully collected,
+# so `TwitterCollector.fetch_recent_tweets_incremental` only asks the API for the gaps.
+
+
+import json, os, re, hashlib
+from datetime import datetime, timezone
+
+from TweetSink import JsonlSink, iter_tweets
+
+
+def to_utc(value):
+    '''convert a datetime or an ISO string (e.g. `created_at`) to a naive UTC datetime, the way tweepy reads naive datetimes'''
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo = None)
+    return value.replace(microsecond = 0)
+
+
+class CollectionStore():
+    '''Tweets of one query stored as a jsonl collection, plus the list of time intervals that were fully collected.'''
+
+    def __init__(self, query, store_dir = 'collection_store'):
+        '''
+        `query`: the search query. Each query gets its own sub directory.
+        `store_dir`: the directory holding the stores of all queries.
+        '''
+        self.query = query
+        slug = re.sub(r'[^0-9A-Za-z]+', '_', query).strip('_')[:60]
+        digest = hashlib.md5(query.encode('utf-8')).hexdigest()[:8]
+        self.store_dir = os.path.join(store_dir, '%s_%s' % (slug, digest))
+        if not os.path.exists(self.store_dir):  # make sure the directory exists
+            os.makedirs(self.store_dir)
+        self.coverage_file = os.path.join(self.store_dir, 'coverage.json')
+
+        self.intervals = []
+        if os.path.exists(self.coverage_file):
+            with open(self.coverage_file, encoding = 'utf-8') as f:
+                self.intervals = [(to_utc(s), to_utc(e)) for s, e in json.load(f)['intervals']]
+
+        self.sink = JsonlSink('tweets', save_dir = self.store_dir, append = True)
+        self.ids = set()
+        for tweet in iter_tweets(self.sink.manifest_file):
+            self.ids.add(str(tweet['id']))
+        self.sink.tweet_cnt = len(self.ids)
+
+    def gaps(self, start_time, end_time):
+        '''return the sub-intervals of [start_time, end_time) that have not been collected yet'''
+        start_time, end_time = to_utc(start_time), to_utc(end_time)
+        gaps = []
+        cursor = start_time
+        for s, e in self.intervals:  # the intervals are sorted and disjoint
+            if e <= cursor:
+                continue
+            if s >= end_time:
+                break
+            if s > cursor:
+                gaps.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < end_time:
+            gaps.append((cursor, end_time))
+        return gaps
+
+    def add_interval(self, start_time, end_time):
+        '''record [start_time, end_time) as fully collected, merging it with the overlapping intervals'''
+        start_time, end_time = to_utc(start_time), to_utc(end_time)
+        if start_time >= end_time:
+            return
+        merged = []
+        for s, e in sorted(self.intervals + [(start_time, end_time)]):
+            if merged and s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        self.intervals = merged
+        self.save()
+
+    def add_tweets(self, tweets):
+        '''store the tweets that are not in the store yet, return how many were new'''
+        added = 0
+        for tweet in tweets:
+            if str(tweet['id']) in self.ids:
+                continue
+            self.ids.add(str(tweet['id']))
+            self.sink.write(tweet)
+            added += 1
+        self.sink.flush()
+        return added
+
+    def tweets_between(self, start_time, end_time):
+        '''return the stored tweets created in [start_time, end_time), newest first'''
+        start_time, end_time = to_utc(start_time), to_utc(end_time)
+        tweets = [tweet for tweet in iter_tweets(self.sink.manifest_file)
+                  if start_time <= to_utc(tweet['created_at']) < end_time]
+        tweets.sort(key = lambda tweet: int(tweet['id']), reverse = True)
+        return tweets
+
+    def save(self):
+        with open(self.coverage_file + '.tmp', 'w', encoding = 'utf-8') as w:
+            w.write(json.dumps({'query': self.query
+                                , 'intervals': [(s.isoformat(), e.isoformat()) for s, e in self.intervals]}, indent=4))
+        os.replace(self.coverage_file + '.tmp', self.coverage_file)
+
+    def close(self):
+        self.sink.close({'collection_type': 'recent post', 'query': self.query})
@@ -0,0 +1,74 @@
+# -*- coding:utf-8 -*-
+
+# Note: Engagement scores and top-k selection over the columnar tables of `TweetTable`. A score is a weighted sum of
+# metric columns computed in one vectorized pass, and the top-k is found by partial selection instead of sorting
+# every score, with ties kept in row order so each tweet or author is returned once.
+
+
+import numpy as np
+import pandas as pd
+
+
+# the sums used in the analysis: every public metric counts once
+TWEET_WEIGHTS = {'retweet_count': 1, 'reply_count': 1, 'like_count': 1, 'quote_count': 1}
+AUTHOR_WEIGHTS = {'followers_count': 1, 'following_count': 1, 'tweet_count': 1, 'listed_count': 1}
+
+
+def engagement_scores(table, weights = None, authors = None):
+    '''Weighted sum of metric columns, one score per row of `table`.
+    `table`: a DataFrame from `TweetTable` (or any mapping of column name to array).
+    `weights`: dict of column name to weight. Defaults to `TWEET_WEIGHTS`.
+    `authors`: an author table. Weights on columns that `table` does not have (e.g. `followers_count` or `listed_count`
+            for tweets) are read from the author of each row, joined by `author_id`. Unknown authors count as 0.
+    '''
+    if weights is None:
+        weights = TWEET_WEIGHTS
+    n = len(table['id']) if 'id' in table else len(next(iter(table.values())))
+    scores = np.zeros(n, dtype = np.float64)
+    rows = None
+    for column, weight in weights.items():
+        if not weight:
+            continue
+        if column in table:
+            values = np.asarray(table[column], dtype = np.float64)
+        elif authors is not None and column in authors:
+            if rows is None:
+                rows = pd.Index(authors['id']).get_indexer(np.asarray(table['author_id']))
+            values = np.where(rows >= 0, np.asarray(authors[column], dtype = np.float64)[rows], 0.0)
+        else:
+            raise KeyError('no column %r for the engagement score' % column)
+        scores += weight * values
+    return scores
+
+
+def top_k(scores, k = 3, largest = True):
+    '''Positions of the `k` largest (or smallest) scores, best first. Equal scores keep their row order.
+    Only the candidates found by `np.partition` are sorted, so this is linear in the number of scores.'''
+    scores = np.asarray(scores)
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype = np.int64)
+    keys = -scores if largest else scores
+    if k == n:
+        return np.argsort(keys, kind = 'stable')
+    threshold = np.partition(keys, k - 1)[k - 1]
+    better = np.flatnonzero(keys < threshold)
+    tied = np.flatnonzero(keys == threshold)[:k - len(better)]
+    candidates = np.concatenate([better, tied])
+    return candidates[np.lexsort((candidates, keys[candidates]))]
+
+
+def top_tweets(table, k = 3, weights = None, authors = None):
+    '''The `k` most engaging tweets of a tweet table, best first, with their `score`. See `engagement_scores`.'''
+    scores = engagement_scores(table, weights, authors)
+    rows = top_k(scores, k)
+    result = table.iloc[rows].copy()
+    result['score'] = scores[rows]
+    return result
+
+
+def top_authors(authors, k = 3, weights = None):
+    '''The `k` most influential authors of an author table, best first, with their `score`.
+    `weights` defaults to `AUTHOR_WEIGHTS`, the sum of followers, following, tweets and listed.'''
+    return top_tweets(authors, k, AUTHOR_WEIGHTS if weights is None else weights)
@@ -0,0 +1,72 @@
+# -*- coding:utf-8 -*-
+
+# Note: Hashtags, mentions, links and cashtags read from the `entities` field that the collector already requests,
+# instead of re-cleaning every tweet and keeping the tokens that contain "#" or "@". The entities are case folded so
+# "#BornPink" and "#bornpink" are counted together. Tweets without `entities` (e.g. old collections) fall back to
+# parsing the text with the same rules.
+
+
+import re
+from collections import Counter
+from urllib.parse import urlsplit
+
+from TweetCleaner import URL_REGEX
+
+
+ENTITY_TYPES = ['hashtags', 'mentions', 'urls', 'domains', 'cashtags']
+
+# the rules of the Twitter parser, simplified: a sign not preceded by a word character or another sign
+HASHTAG_REGEX = re.compile(r'(?<![\w&#＃])[#＃](\w*[^\W\d]\w*)')
+MENTION_REGEX = re.compile(r'(?<![\w@＠])[@＠](\w{1,15})\b')
+CASHTAG_REGEX = re.compile(r'(?<![\w$])\$([a-zA-Z]{1,6}(?:[._][a-zA-Z]{1,2})?)\b')
+
+
+def _normalize_url(url):
+    '''the link with its scheme and host in lower case and without a trailing "/"'''
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url.rstrip('/')
+    return ('%s://%s%s' % (parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'))) + ('?' + parts.query if parts.query else '')
+
+
+def _domain(url):
+    domain = urlsplit(url if '://' in url else 'http://' + url).netloc.lower()
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+def extract_entities(tweet):
+    '''The normalized entities of one tweet: a dict of lists for each of `ENTITY_TYPES`.
+    Hashtags, mentions and cashtags keep their sign and are case folded (e.g. "#bornpink", "@blackpink", "$aapl").
+    Links use the expanded url when the API gives it.'''
+    result = {}
+    entities = tweet.get('entities')
+    if entities is not None:
+        result['hashtags'] = ['#' + hashtag['tag'].casefold() for hashtag in entities.get('hashtags', [])]
+        result['mentions'] = ['@' + mention['username'].casefold() for mention in entities.get('mentions', [])]
+        result['cashtags'] = ['$' + cashtag['tag'].casefold() for cashtag in entities.get('cashtags', [])]
+        urls = [url.get('unwound_url') or url.get('expanded_url') or url['url'] for url in entities.get('urls', [])]
+    else:
+        text = tweet.get('text', '')
+        result['hashtags'] = ['#' + tag.casefold() for tag in HASHTAG_REGEX.findall(text)]
+        result['mentions'] = ['@' + name.casefold() for name in MENTION_REGEX.findall(text)]
+        result['cashtags'] = ['$' + tag.casefold() for tag in CASHTAG_REGEX.findall(text)]
+        urls = [url.rstrip('.,;:!?)\'"') for url in URL_REGEX.findall(text)]
+    result['urls'] = [_normalize_url(url) for url in urls]
+    result['domains'] = [_domain(url) for url in result['urls']]
+    return result
+
+
+def entity_counts(tweets):
+    '''Count the entities of many tweets in one pass.
+    `tweets`: the tweet dicts (e.g. `json_data['tweets']`).
+    Returns a dict with a Counter for each of `ENTITY_TYPES`, and `fallback`, the number of tweets without `entities`
+    whose text was parsed instead.
+    '''
+    result = {entity_type: Counter() for entity_type in ENTITY_TYPES}
+    result['fallback'] = 0
+    for tweet in tweets:
+        if tweet.get('entities') is None:
+            result['fallback'] += 1
+        for entity_type, values in extract_entities(tweet).items():
+            result[entity_type].update(values)
+    return result
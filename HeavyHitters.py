@@ -0,0 +1,251 @@
+# -*- coding:utf-8 -*-
+
+# Note: Approximate top-k counters with a fixed memory budget, to replace the lists of every word, hashtag and mention
+# handed to `Counter(...).most_common(10)`. `SpaceSaving` keeps at most `capacity` items and overestimates a count by
+# at most `total / capacity`; `CountMinTopK` keeps a count-min sketch and a heap of the current leaders. Both can be
+# merged, e.g. one counter per collection file or per stream. `TweetHeavyHitters` counts words, hashtags and mentions
+# of tweets, in batch over a collection or live as a `TwitterStreamer` listener.
+
+
+import heapq, threading, hashlib, random
+from collections import Counter
+
+import numpy as np
+
+from Entities import extract_entities
+from TweetCleaner import fast_clean, words
+
+
+# the Mersenne prime of the row hashes of `CountMinTopK`
+_PRIME = (1 << 61) - 1
+
+
+class SpaceSaving():
+    '''The Space-Saving algorithm: the `capacity` most frequent items with counts that are never too low, and too high
+    by at most the `error` recorded when the item replaced the smallest one.'''
+
+    def __init__(self, capacity = 1000):
+        '''
+        `capacity`: the number of items kept. Any item seen more than `total / capacity` times is guaranteed to be kept.
+        '''
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # min-heap of (count, item), with stale entries skipped when popping
+        self.heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self.heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def update(self, item, count = 1):
+        '''add `count` occurrences of `item`'''
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # the new item takes the place of the smallest one and inherits its count as the error
+            smallest, evicted = self._pop_min()
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[item] = smallest + count
+            self.errors[item] = smallest
+        heapq.heappush(self.heap, (self.counts[item], item))
+        # the stale entries are dropped once they outnumber the live ones
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def update_many(self, items):
+        '''add one occurrence of every item of an iterable'''
+        for item in items:
+            self.update(item)
+
+    def error_bound(self):
+        '''the maximum overestimation of any count'''
+        return self.total / self.capacity
+
+    def most_common(self, k = 10):
+        '''the `k` largest (item, count) pairs, like `Counter.most_common`'''
+        return heapq.nlargest(k, self.counts.items(), key = lambda pair: pair[1])
+
+    def top(self, k = 10):
+        '''The `k` largest items as (item, count, error) tuples. The true count is between `count - error` and `count`;
+        an item is surely among the top ones when `count - error` is at least the count of the next item.'''
+        return [(item, count, self.errors[item]) for item, count in self.most_common(k)]
+
+    def merge(self, other):
+        '''A new counter with the counts of both. An item missing from a full counter may have been seen up to the
+        smallest count of that counter, which is added to its count and error.'''
+        floor = min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+        other_floor = min(other.counts.values()) if len(other.counts) >= other.capacity else 0
+        counts = {}
+        errors = {}
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, floor) + other.errors.get(item, other_floor)
+        result = SpaceSaving(max(self.capacity, other.capacity))
+        result.total = self.total + other.total
+        for item, count in heapq.nlargest(result.capacity, counts.items(), key = lambda pair: pair[1]):
+            result.counts[item] = count
+            result.errors[item] = errors[item]
+        result.heap = [(count, item) for item, count in result.counts.items()]
+        heapq.heapify(result.heap)
+        return result
+
+
+class CountMinTopK():
+    '''A count-min sketch with a heap of the `k` items with the largest estimates. An estimate is never too low, and
+    too high by more than `e * total / width` with a probability of at most `exp(-depth)`.'''
+
+    def __init__(self, k = 100, width = 2 ** 16, depth = 4):
+        '''
+        `k`: the number of leaders kept.
+        `width` / `depth`: the size of the sketch, `width * depth` 64-bit counters.
+        '''
+        self.k = k
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype = np.int64)
+        self.rows = np.arange(depth)
+        # one universal hash (a * h + b) mod p mod width per row, independent of each other. Fixed per depth, so
+        # sketches of the same size can be merged
+        rng = random.Random(depth)
+        self.hashes = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(depth)]
+        self.total = 0
+        # the current leaders: item -> estimate, and a min-heap of them with stale entries
+        self.leaders = {}
+        self.heap = []
+
+    def _columns(self, item):
+        data = item.encode('utf-8') if isinstance(item, str) else bytes(str(item), 'utf-8')
+        # the item is hashed once to 64 bits, the rows then apply their own hash to it
+        h = int.from_bytes(hashlib.blake2b(data, digest_size = 8).digest(), 'little')
+        return [(a * h + b) % _PRIME % self.width for a, b in self.hashes]
+
+    def estimate(self, item):
+        '''the estimated count of an item, never lower than the true count'''
+        return int(self.table[self.rows, self._columns(item)].min())
+
+    def update(self, item, count = 1):
+        '''add `count` occurrences of `item`'''
+        columns = self._columns(item)
+        self.table[self.rows, columns] += count
+        self.total += count
+        self._offer(item, int(self.table[self.rows, columns].min()))
+
+    def update_many(self, items):
+        '''add one occurrence of every item of an iterable, the sketch is updated once for the whole batch'''
+        batch = Counter(items)
+        if not batch:
+            return
+        keys = list(batch)
+        columns = np.array([self._columns(item) for item in keys])
+        counts = np.fromiter(batch.values(), dtype = np.int64, count = len(keys))
+        np.add.at(self.table, (np.broadcast_to(self.rows, columns.shape), columns), counts[:, None])
+        self.total += int(counts.sum())
+        for item, estimate in zip(keys, self.table[self.rows, columns].min(axis = 1).tolist()):
+            self._offer(item, estimate)
+
+    def _offer(self, item, estimate):
+        if item in self.leaders or len(self.leaders) < self.k:
+            self.leaders[item] = estimate
+            heapq.heappush(self.heap, (estimate, item))
+        else:
+            while self.heap[0][0] != self.leaders.get(self.heap[0][1]):
+                heapq.heappop(self.heap)
+            if estimate > self.heap[0][0]:
+                _, evicted = heapq.heapreplace(self.heap, (estimate, item))
+                del self.leaders[evicted]
+                self.leaders[item] = estimate
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(estimate, key) for key, estimate in self.leaders.items()]
+            heapq.heapify(self.heap)
+
+    def error_bound(self):
+        '''the overestimation that is exceeded with a probability of at most `exp(-depth)`'''
+        return np.e * self.total / self.width
+
+    def most_common(self, k = 10):
+        '''the `k` largest (item, estimate) pairs, like `Counter.most_common`'''
+        return heapq.nlargest(k, self.leaders.items(), key = lambda pair: pair[1])
+
+    def merge(self, other):
+        '''a new sketch with the counts of both, they must have the same width and depth'''
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('only sketches of the same width and depth can be merged')
+        result = CountMinTopK(max(self.k, other.k), self.width, self.depth)
+        result.table = self.table + other.table
+        result.total = self.total + other.total
+        for item in self.leaders.keys() | other.leaders.keys():
+            result._offer(item, result.estimate(item))
+        return result
+
+
+class TweetHeavyHitters():
+    '''Words, hashtags and mentions of tweets counted with `SpaceSaving`, in a fixed amount of memory.
+    The words are those of the analysis (cleaned, before the first link, lower case, without stopwords and short
+    words); the hashtags and mentions come from `Entities.extract_entities`.
+    Use `add_many` over a collection, or `streamer.add_listener(counter.add)` to count a stream as it arrives.
+    '''
+
+    KINDS = ('words', 'hashtags', 'mentions')
+
+    def __init__(self, capacity = 1000, stopwords = (), min_len = 3):
+        '''
+        `capacity`: the number of items kept per kind.
+        `stopwords` / `min_len`: the words that are not counted, as in `PreprocessedTweets.filtered_words`.
+        '''
+        self.stopwords = set(stopwords)
+        self.min_len = min_len
+        self.counters = {kind: SpaceSaving(capacity) for kind in self.KINDS}
+        self.tweet_cnt = 0
+        # the stream worker updates while a dashboard reads
+        self.lock = threading.Lock()
+
+    def add(self, tweet, tags = None, cleaned = None):
+        '''count one tweet dict; `tags` (the matched stream rules) is accepted so this can be a streamer listener.
+        `cleaned` skips the cleaning when the text was already cleaned with `fast_clean`.'''
+        entities = extract_entities(tweet)
+        if cleaned is None:
+            cleaned = fast_clean(tweet.get('text', ''))
+        tweet_words = [word.lower() for word in words(cleaned)
+                       if word not in self.stopwords and len(word) >= self.min_len]
+        with self.lock:
+            self.tweet_cnt += 1
+            self.counters['words'].update_many(tweet_words)
+            self.counters['hashtags'].update_many(entities['hashtags'])
+            self.counters['mentions'].update_many(entities['mentions'])
+
+    def add_many(self, tweets):
+        '''count the tweet dicts of a collection (e.g. `json_data['tweets']` or `TweetSink.iter_tweets(manifest)`)'''
+        for tweet in tweets:
+            self.add(tweet)
+
+    def most_common(self, kind = 'words', k = 10):
+        '''the `k` most frequent items of a kind ('words', 'hashtags' or 'mentions'), like `Counter.most_common`'''
+        with self.lock:
+            return self.counters[kind].most_common(k)
+
+    def top(self, kind = 'words', k = 10):
+        '''the `k` most frequent items of a kind as (item, count, error) tuples, see `SpaceSaving.top`'''
+        with self.lock:
+            return self.counters[kind].top(k)
+
+    def merge(self, other):
+        '''a new counter with the counts of both'''
+        result = TweetHeavyHitters(max(self.counters['words'].capacity, other.counters['words'].capacity)
+                                   , self.stopwords, self.min_len)
+        with self.lock, other.lock:
+            result.tweet_cnt = self.tweet_cnt + other.tweet_cnt
+            for kind in self.KINDS:
+                result.counters[kind] = self.counters[kind].merge(other.counters[kind])
+        return result
@@ -0,0 +1,178 @@
+# -*- coding:utf-8 -*-
+
+# Note: A fast sentiment backend for dashboards. It reads the same lexicon as TextBlob (`en-sentiment.xml`) and
+# follows its rules (modifiers such as "very", negations such as "not", "!" and emoticons), but the words are turned
+# into token ids once and the whole corpus is scored with numpy reductions instead of one TextBlob per text.
+# It is an approximation: see `agreement` and `bench_sentiment.py` for how close it is to TextBlob.
+
+
+import os, re, importlib.util
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+
+NEGATIONS = ('no', 'not', "n't", 'never')
+
+# the emoticons of pattern / TextBlob and their polarity
+EMOTICONS = {
+    1.00: ('<3', '>:D', ':-D', ':D', '=-D', '=D', 'X-D', 'x-D', 'XD', 'xD', '8-D'),
+    0.75: ('>:P', ':-P', ':P', ':-p', ':p', ':-b', ':b', ':c)', ':o)', ':^)'),
+    0.50: ('>:)', ':-)', ':)', '=)', '=]', ':]', ':}', ':>', ':3', '8)', '8-)'),
+    0.25: ('>;]', ';-)', ';)', ';-]', ';]', ';D', ';^)', '*-)', '*)'),
+    0.05: ('>:o', ':-O', ':O', ':o', ':-o', 'o_O', 'o.O'),
+    -0.25: ('>:/', ':-/', ':/', ':\\', '>:\\', ':-.', ':-s', ':s', ':S', ':-S', '>.>'),
+    -0.75: ('>:[', ':-(', ':(', '=(', ':-[', ':[', ':{', ':-<', ':c', ':-c', '=/'),
+    -1.00: (":'(", ":'''(", ";'("),
+}
+
+
+def default_lexicon_file():
+    '''the `en-sentiment.xml` shipped with textblob'''
+    spec = importlib.util.find_spec('textblob')
+    if spec is None:
+        raise ImportError('the default lexicon comes with textblob: pip install textblob, or pass `lexicon_file`')
+    return os.path.join(os.path.dirname(spec.origin), 'en', 'en-sentiment.xml')
+
+
+def load_lexicon(lexicon_file):
+    '''Read a pattern sentiment lexicon. Like TextBlob, the senses of a word are averaged per part of speech, then the
+    parts of speech are averaged. Returns {word: (polarity, subjectivity, intensity, is_modifier)}, where modifiers
+    are the words with an adverb sense ("very", "really", ...).'''
+    senses = {}
+    for word in ElementTree.parse(lexicon_file).getroot().findall('word'):
+        form = word.attrib.get('form')
+        if not form:
+            continue
+        scores = (float(word.attrib.get('polarity', 0.0))
+                  , float(word.attrib.get('subjectivity', 0.0))
+                  , float(word.attrib.get('intensity', 1.0)))
+        senses.setdefault(form, {}).setdefault(word.attrib.get('pos'), []).append(scores)
+    lexicon = {}
+    for form, by_pos in senses.items():
+        per_pos = [np.mean(scores, axis = 0) for scores in by_pos.values()]
+        polarity, subjectivity, intensity = np.mean(per_pos, axis = 0)
+        lexicon[form] = (polarity, subjectivity, intensity, 'RB' in by_pos)
+    return lexicon
+
+
+class LexiconSentiment():
+    '''Vectorized lexicon sentiment, a drop-in for `TextBlob(text).sentiment` over many texts.'''
+
+    def __init__(self, lexicon_file = None):
+        '''
+        `lexicon_file`: a pattern sentiment lexicon. Defaults to the English lexicon of TextBlob.
+        '''
+        lexicon = load_lexicon(lexicon_file or default_lexicon_file())
+        for polarity, faces in EMOTICONS.items():
+            for face in faces:
+                lexicon.setdefault(face.lower(), (polarity, 1.0, 1.0, False))
+
+        # token id 0 is every unknown word, the known words and the special tokens follow
+        vocabulary = list(lexicon) + [token for token in NEGATIONS + ('!',) if token not in lexicon]
+        self.index = pd.Index(vocabulary)
+        size = len(vocabulary) + 1
+        self.polarity = np.zeros(size)
+        self.subjectivity = np.zeros(size)
+        self.intensity = np.ones(size)
+        self.in_lexicon = np.zeros(size, dtype = bool)
+        self.is_modifier = np.zeros(size, dtype = bool)
+        for token_id, word in enumerate(lexicon, 1):
+            self.polarity[token_id], self.subjectivity[token_id], self.intensity[token_id], self.is_modifier[token_id] = lexicon[word]
+        self.in_lexicon[1:len(lexicon) + 1] = True
+        self.is_negation = np.zeros(size, dtype = bool)
+        self.is_negation[self.index.get_indexer(list(NEGATIONS)) + 1] = True
+        self.is_bang = np.zeros(size, dtype = bool)
+        self.is_bang[self.index.get_indexer(['!'])[0] + 1] = True
+
+        faces = sorted((face.lower() for faces in EMOTICONS.values() for face in faces), key = len, reverse = True)
+        # emoticons first, then the "do|n't" split of TextBlob, words, and exclamation marks
+        self.token_regex = re.compile('|'.join(re.escape(face) for face in faces) + r"|[a-z0-9]+(?=n't)|n't|[a-z0-9]+(?:[-'][a-z0-9]+)*|!")
+
+    def tokenize(self, texts):
+        '''Token ids of all texts as one flat array. Returns a dict with `ids`, `lengths` (token length, to find the
+        small words that TextBlob skips over) and `doc` (the text of each token).'''
+        tokens = []
+        counts = []
+        for text in texts:
+            found = self.token_regex.findall(text.lower())
+            tokens.extend(found)
+            counts.append(len(found))
+        result = {}
+        result['ids'] = self.index.get_indexer(tokens) + 1 if tokens else np.empty(0, dtype = np.int64)
+        result['lengths'] = np.fromiter(map(len, tokens), dtype = np.int64, count = len(tokens))
+        result['doc'] = np.repeat(np.arange(len(counts)), counts)
+        result['texts'] = len(counts)
+        return result
+
+    def _previous(self, doc, flags, skip):
+        '''the position of the token before each token if `flags` holds for it, or the one before that if the token in
+        between is in `skip`; -1 otherwise'''
+        n = len(doc)
+        result = np.full(n, -1)
+        if n > 1:
+            hit = (doc[1:] == doc[:-1]) & flags[:-1]
+            result[1:][hit] = np.flatnonzero(hit)
+        if n > 2:
+            hit = (doc[2:] == doc[:-2]) & flags[:-2] & skip[1:-1] & (result[2:] < 0)
+            result[2:][hit] = np.flatnonzero(hit)
+        return result
+
+    def score(self, texts):
+        '''Score a list of texts.
+        Returns a dict with `polarity` and `subjectivity`, float64 arrays aligned with `texts`, like `SentimentEngine.score`.
+        '''
+        tokens = self.tokenize(texts)
+        ids, doc, n_texts = tokens['ids'], tokens['doc'], tokens['texts']
+        assessed = self.in_lexicon[ids]
+        polarity = self.polarity[ids]
+        subjectivity = self.subjectivity[ids]
+
+        # "very good": the modifier is merged into the next known word, whose scores are multiplied by its intensity.
+        # unknown words of up to 2 letters may sit in between ("really is a good")
+        modifier = self._previous(doc, self.is_modifier[ids], ~assessed & (tokens['lengths'] <= 2))
+        modified = assessed & (modifier >= 0)
+        factor = self.intensity[ids[modifier[modified]]]
+        polarity[modified] = np.clip(polarity[modified] * factor, -1.0, 1.0)
+        subjectivity[modified] = np.clip(subjectivity[modified] * factor, -1.0, 1.0)
+        assessed[modifier[modified]] = False
+
+        # "not good", "not a good", "not very good": the polarity is multiplied by -0.5
+        negation = self._previous(doc, self.is_negation[ids], ~assessed & (tokens['lengths'] <= 1)) >= 0
+        negated = negation.copy()
+        negated[modified] |= negation[modifier[modified]]
+
+        # each "!" multiplies the polarity of the last known word before it by 1.25
+        positions = np.flatnonzero(assessed)
+        bangs = np.flatnonzero(self.is_bang[ids])
+        last = np.cumsum(assessed)[bangs] - 1
+        valid = last >= 0
+        valid[valid] = doc[positions[last[valid]]] == doc[bangs[valid]]
+        boost = 1.25 ** np.bincount(last[valid], minlength = len(positions))
+
+        values = np.clip(polarity[positions] * boost, -1.0, 1.0)
+        values = np.where(negated[positions], values * -0.5, values)
+        counts = np.maximum(np.bincount(doc[positions], minlength = n_texts), 1)
+        result = {}
+        result['polarity'] = np.bincount(doc[positions], weights = values, minlength = n_texts) / counts
+        result['subjectivity'] = np.bincount(doc[positions], weights = subjectivity[positions], minlength = n_texts) / counts
+        return result
+
+
+def agreement(reference, fast, tolerance = 0.1):
+    '''Compare two sets of scores (e.g. TextBlob and `LexiconSentiment`), both dicts of `polarity` / `subjectivity` arrays.
+    Returns the correlation, the mean absolute difference, the share of texts within `tolerance` and the share of
+    texts with the same polarity sign (negative, neutral or positive).'''
+    result = {}
+    for key in ('polarity', 'subjectivity'):
+        a = np.asarray(reference[key])
+        b = np.asarray(fast[key])
+        result[key] = {}
+        result[key]['correlation'] = float(np.corrcoef(a, b)[0, 1]) if len(a) > 1 and a.std() and b.std() else float('nan')
+        result[key]['mean_abs_diff'] = float(np.abs(a - b).mean()) if len(a) else 0.0
+        result[key]['within_tolerance'] = float((np.abs(a - b) <= tolerance).mean()) if len(a) else 1.0
+    a = np.asarray(reference['polarity'])
+    b = np.asarray(fast['polarity'])
+    result['polarity']['same_sign'] = float((np.sign(a) == np.sign(b)).mean()) if len(a) else 1.0
+    return result
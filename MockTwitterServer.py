@@ -0,0 +1,316 @@
+# -*- coding:utf-8 -*-
+
+# Note: A local stand-in for the Twitter API v2 endpoints used by `TwitterCollector` and `TwitterStreamer`
+# (recent search, user lookup, filtered stream and its rules). It serves fixture corpora shaped like `bp.json` and
+# `author_info_list.json`, with configurable latency, rate limit headers and 429 responses, so the collectors can be
+# benchmarked and tried out without network access or API quota.
+#
+#     server = MockTwitterServer(tweets, authors, latency = 0.05).start()
+#     with server.redirect():  # requests to https://api.twitter.com now go to the local server
+#         tc = TwitterCollector('any token')
+#         tc.fetch_recent_tweets('"BORN PINK"', tweets_cnt = 1000, save_result = False)
+#     server.stop()
+
+
+import json, time, random, threading, contextlib
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+
+API_HOST = 'https://api.twitter.com'
+
+
+def synthetic_tweets(authors, tweets_cnt = 10000, end_time = None, seed = 0):
+    '''Generate a corpus shaped like `bp.json['tweets']`, written by the given authors, newest first.
+    `authors`: user objects (e.g. `author_info_list.json`), `None` entries are skipped.
+    `end_time`: the creation time of the newest tweet. If not specified, now.
+    '''
+    rng = random.Random(seed)
+    author_ids = [author['id'] for author in authors if author]
+    words = ['born', 'pink', 'blackpink', 'album', 'shutdown', 'pink venom', 'love', 'lisa', 'jennie', 'rose', 'jisoo'
+             , 'billboard', 'typa girl', 'tally', 'yeah yeah yeah', 'wts', 'lfb', 'pcs', 'ready for love', 'best', 'hate']
+    sources = ['Twitter for iPhone', 'Twitter for Android', 'Twitter Web App', 'Twitter for iPad']
+    end_time = end_time or datetime.utcnow()
+    tweets = []
+    for i in range(tweets_cnt):
+        text = ' '.join(rng.choice(words) for _ in range(rng.randint(4, 14)))
+        if rng.random() < 0.5:
+            text = 'BORN PINK ' + text
+        if rng.random() < 0.3:
+            text += ' #BLACKPINK #BORNPINK'
+        if rng.random() < 0.2:
+            text = '@BLACKPINK ' + text
+        text += ' https://t.co/%08x' % rng.getrandbits(32)
+        created_at = end_time - timedelta(seconds = i * 30)
+        tweets.append({'id': str(1576000000000000000 - i)
+                       , 'text': text
+                       , 'author_id': rng.choice(author_ids)
+                       , 'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+                       , 'lang': 'en'
+                       , 'source': rng.choice(sources)
+                       , 'possibly_sensitive': False
+                       , 'edit_history_tweet_ids': [str(1576000000000000000 - i)]
+                       , 'public_metrics': {'retweet_count': rng.randint(0, 50), 'reply_count': rng.randint(0, 10)
+                                            , 'like_count': rng.randint(0, 200), 'quote_count': rng.randint(0, 5)}})
+    return tweets
+
+
+def _rule_matches(rule_value, text):
+    '''a crude stand-in for the rule matcher: every plain term of the rule must appear in the text'''
+    text = text.lower()
+    for term in rule_value.lower().replace('"', ' ').split():
+        if ':' in term or term.startswith('-') or term in ('or', 'and'):
+            continue
+        if term not in text:
+            return False
+    return True
+
+
+class MockTwitterServer():
+    '''A threaded HTTP server answering the Twitter API v2 endpoints used in this project.'''
+
+    def __init__(self, tweets, authors
+                    , host = '127.0.0.1'
+                    , port = 0
+                    , latency = 0.0
+                    , rate_limits = None
+                    , window = 15 * 60
+                    , error_every = 0
+                    , stream_rate = 100.0
+                    ):
+        '''
+        `tweets`: the corpus served by recent search and the stream, e.g. `bp.json['tweets']` or `synthetic_tweets(...)`.
+        `authors`: the user objects served by the user lookup, e.g. `author_info_list.json`.
+        `port`: 0 picks a free port.
+        `latency`: seconds added to every response.
+        `rate_limits`: dict of endpoint -> requests per window, the endpoints are 'search', 'user', 'users' and 'rules'.
+                    Defaults to the v2 app limits (450 searches, 300 user lookups per 15 minutes).
+        `window`: the rate limit window in seconds, use a short one to test the waiting behaviour.
+        `error_every`: answer every n-th request with a 429 regardless of the budget (0 = never).
+        `stream_rate`: tweets per second sent on the filtered stream.
+        '''
+        self.tweets = sorted(tweets, key = lambda tweet: int(tweet['id']), reverse = True)
+        self.authors = {str(author['id']): author for author in authors if author}
+        self.latency = latency
+        self.rate_limits = {'search': 450, 'user': 300, 'users': 300, 'rules': 450}
+        if rate_limits:
+            self.rate_limits.update(rate_limits)
+        self.window = window
+        self.error_every = error_every
+        self.stream_rate = stream_rate
+
+        self.rules = {}
+        self._next_rule_id = 1
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # counters
+        self.requests = 0
+        self.throttled = 0
+
+        handler = type('Handler', (_Handler,), {'mock': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://%s:%d' % self.httpd.server_address
+        self._thread = None
+
+    def start(self):
+        '''serve in a background thread'''
+        self._thread = threading.Thread(target = self.httpd.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @contextlib.contextmanager
+    def redirect(self):
+        '''Send every `requests` call to https://api.twitter.com to this server while the context is open.
+        This covers `tweepy.Client` and `tweepy.StreamingClient` without changing them.
+        '''
+        original_send = requests.adapters.HTTPAdapter.send
+        url = self.url
+
+        def send(adapter, request, **kwargs):
+            if request.url.startswith(API_HOST):
+                request.url = url + request.url[len(API_HOST):]
+            return original_send(adapter, request, **kwargs)
+
+        requests.adapters.HTTPAdapter.send = send
+        try:
+            yield self
+        finally:
+            requests.adapters.HTTPAdapter.send = original_send
+
+    def take(self, endpoint, token = None):
+        '''Count one request of a bearer token on `endpoint`, like the API every token has its own budget.
+        Returns (allowed, rate limit headers).'''
+        with self._lock:
+            self.requests += 1
+            now = time.time()
+            bucket = self._buckets.get((token, endpoint))
+            if bucket is None or bucket['reset'] <= now:
+                bucket = self._buckets[(token, endpoint)] = {'remaining': self.rate_limits[endpoint], 'reset': int(now + self.window) + 1}
+            allowed = bucket['remaining'] > 0 and not (self.error_every and self.requests % self.error_every == 0)
+            if allowed:
+                bucket['remaining'] -= 1
+            else:
+                self.throttled += 1
+            headers = {'x-rate-limit-limit': str(self.rate_limits[endpoint])
+                       , 'x-rate-limit-remaining': str(bucket['remaining'])
+                       , 'x-rate-limit-reset': str(bucket['reset'])}
+            return allowed, headers
+
+    def search(self, params):
+        '''the /2/tweets/search/recent response'''
+        tweets = self.tweets
+        if 'start_time' in params:
+            tweets = [tweet for tweet in tweets if tweet['created_at'] >= params['start_time'][:19]]
+        if 'end_time' in params:
+            tweets = [tweet for tweet in tweets if tweet['created_at'] < params['end_time'][:19]]
+        if 'since_id' in params:
+            tweets = [tweet for tweet in tweets if int(tweet['id']) > int(params['since_id'])]
+        if 'until_id' in params:
+            tweets = [tweet for tweet in tweets if int(tweet['id']) < int(params['until_id'])]
+        offset = int(params.get('next_token', 0))
+        max_results = int(params.get('max_results', 10))
+        page = tweets[offset:offset + max_results]
+
+        body = {'meta': {'result_count': len(page)}}
+        if page:
+            body['data'] = page
+            body['meta']['newest_id'] = page[0]['id']
+            body['meta']['oldest_id'] = page[-1]['id']
+            users = {tweet['author_id']: self.authors[tweet['author_id']] for tweet in page if tweet.get('author_id') in self.authors}
+            if users:
+                body['includes'] = {'users': list(users.values())}
+        if offset + max_results < len(tweets):
+            body['meta']['next_token'] = str(offset + max_results)
+        return body
+
+    def users(self, ids):
+        '''the /2/users response'''
+        body = {}
+        found = [self.authors[i] for i in ids if i in self.authors]
+        if found:
+            body['data'] = found
+        errors = [{'value': i, 'detail': 'Could not find user with ids: [%s].' % i, 'title': 'Not Found Error'
+                   , 'resource_type': 'user', 'parameter': 'ids', 'resource_id': i} for i in ids if i not in self.authors]
+        if errors:
+            body['errors'] = errors
+        return body
+
+    def update_rules(self, payload):
+        '''the POST /2/tweets/search/stream/rules response'''
+        with self._lock:
+            if 'add' in payload:
+                added = []
+                for rule in payload['add']:
+                    rule = {'id': str(self._next_rule_id), 'value': rule['value'], 'tag': rule.get('tag') or rule['value']}
+                    self._next_rule_id += 1
+                    self.rules[rule['id']] = rule
+                    added.append(rule)
+                return {'data': added, 'meta': {'summary': {'created': len(added)}}}
+            deleted = 0
+            for rule_id in payload.get('delete', {}).get('ids', []):
+                if self.rules.pop(str(rule_id), None):
+                    deleted += 1
+            return {'meta': {'summary': {'deleted': deleted}}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    mock = None
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers = None):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _limited(self, endpoint):
+        '''apply the latency and the rate limit, returns the headers or None if a 429 was sent'''
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        allowed, headers = self.mock.take(endpoint, self.headers.get('Authorization'))
+        if not allowed:
+            self._send_json(429, {'title': 'Too Many Requests', 'detail': 'Too Many Requests', 'status': 429}, headers)
+            return None
+        return headers
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/')
+
+        if path == '/2/tweets/search/recent':
+            headers = self._limited('search')
+            if headers is not None:
+                self._send_json(200, self.mock.search(params), headers)
+        elif path == '/2/users':
+            headers = self._limited('users')
+            if headers is not None:
+                self._send_json(200, self.mock.users(params.get('ids', '').split(',')), headers)
+        elif path.startswith('/2/users/'):
+            headers = self._limited('user')
+            if headers is not None:
+                body = self.mock.users([path.rsplit('/', 1)[1]])
+                if 'data' in body:
+                    body['data'] = body['data'][0]
+                self._send_json(200, body, headers)
+        elif path == '/2/tweets/search/stream/rules':
+            headers = self._limited('rules')
+            if headers is not None:
+                rules = list(self.mock.rules.values())
+                self._send_json(200, {'data': rules, 'meta': {'result_count': len(rules)}} if rules else {'meta': {'result_count': 0}}, headers)
+        elif path == '/2/tweets/search/stream':
+            self._stream()
+        else:
+            self._send_json(404, {'title': 'Not Found Error', 'detail': 'Unknown endpoint ' + path})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip('/')
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if path == '/2/tweets/search/stream/rules':
+            headers = self._limited('rules')
+            if headers is not None:
+                self._send_json(200, self.mock.update_rules(payload), headers)
+        else:
+            self._send_json(404, {'title': 'Not Found Error', 'detail': 'Unknown endpoint ' + path})
+
+    def _stream(self):
+        '''send the corpus (oldest first, looping) as newline delimited json, with keep-alive newlines when nothing matches'''
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        interval = 1.0 / self.mock.stream_rate if self.mock.stream_rate else 0
+        try:
+            index = 0
+            tweets = self.mock.tweets[::-1]
+            while tweets:
+                tweet = tweets[index % len(tweets)]
+                index += 1
+                matching = [{'id': rule['id'], 'tag': rule['tag']} for rule in list(self.mock.rules.values())
+                            if _rule_matches(rule['value'], tweet['text'])]
+                if matching:
+                    line = json.dumps({'data': tweet, 'matching_rules': matching}) + '\r\n'
+                else:
+                    line = '\r\n'
+                self.wfile.write(line.encode('utf-8'))
+                self.wfile.flush()
+                if interval:
+                    time.sleep(interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
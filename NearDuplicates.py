@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+
+# Note: Near-duplicate detection for the templated sell/trade tweets (wts, lfb, pcs, ...). Every text gets a MinHash
+# signature of its word shingles, LSH banding proposes candidate pairs in roughly linear time, the pairs whose
+# signatures agree enough are linked, and the connected components are the clusters. The analysis can then run on one
+# representative per cluster and scale the results back up with the cluster sizes.
+
+
+import zlib
+
+import numpy as np
+
+from TweetCleaner import fast_clean_batch, strip_urls, table_dp
+
+
+# the largest prime below 2**32, so the hashed values fit in uint32
+_PRIME = np.uint64(4294967291)
+
+
+def shingles(text, size = 2):
+    '''The hashed word shingles of a cleaned text. Texts shorter than `size` words use their words, and an empty text
+    gets one shingle, so every text has a signature.'''
+    words = strip_urls(text).translate(table_dp).split()
+    if len(words) >= size:
+        grams = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    else:
+        grams = {' '.join(words)}
+    return [zlib.crc32(gram.encode('utf-8')) for gram in grams]
+
+
+def _components(n, pairs):
+    '''connected components of the pairs (u, v): the label of every node is the smallest node of its component'''
+    labels = np.arange(n)
+    if not len(pairs):
+        return labels
+    u, v = pairs[:, 0], pairs[:, 1]
+    while True:
+        smallest = np.minimum(labels[u], labels[v])
+        previous = labels.copy()
+        np.minimum.at(labels, u, smallest)
+        np.minimum.at(labels, v, smallest)
+        # pointer jumping: follow the labels to their root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+class NearDuplicates():
+    '''Clusters of near-duplicate texts, aligned with the input: `self.labels[i]` is the position of the representative
+    (the first text) of the cluster of text i.'''
+
+    def __init__(self, texts
+                , threshold = 0.7
+                , num_perm = 64
+                , bands = 16
+                , shingle_size = 2
+                , seed = 1
+                ):
+        '''
+        `texts`: raw texts or tweet dicts (e.g. `json_data['tweets']`). They are cleaned with `TweetCleaner` and their
+                links are ignored.
+        `threshold`: the estimated Jaccard similarity of the word shingles from which two texts are near-duplicates.
+        `num_perm`: the length of the MinHash signatures.
+        `bands`: the number of LSH bands, `num_perm` must be a multiple of it. Pairs with a similarity above about
+                `(1 / bands) ** (bands / num_perm)` become candidates, which are then checked against `threshold`.
+        `shingle_size`: the number of words per shingle.
+        '''
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        texts = [text['text'] if isinstance(text, dict) else text for text in texts]
+        self.threshold = threshold
+        self.signatures = self._signatures(fast_clean_batch(texts), num_perm, shingle_size, seed)
+        self.labels = _components(len(texts), self._candidate_pairs(bands))
+        self.representatives, self.counts = np.unique(self.labels, return_counts = True)
+
+    @staticmethod
+    def _signatures(cleaned, num_perm, shingle_size, seed):
+        '''the MinHash signatures, one row per text, computed one permutation at a time over all shingles at once'''
+        hashed = [shingles(text, shingle_size) for text in cleaned]
+        counts = np.fromiter(map(len, hashed), dtype = np.int64, count = len(hashed))
+        values = np.fromiter((value for text in hashed for value in text), dtype = np.uint64, count = int(counts.sum()))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]) if len(counts) else counts
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, int(_PRIME), num_perm, dtype = np.uint64)
+        b = rng.integers(0, int(_PRIME), num_perm, dtype = np.uint64)
+        signatures = np.empty((len(hashed), num_perm), dtype = np.uint32)
+        for j in range(num_perm):
+            # a * x + b stays below 2**64 since a, x and b are below 2**32
+            permuted = (a[j] * values + b[j]) % _PRIME
+            if len(counts):
+                signatures[:, j] = np.minimum.reduceat(permuted, starts)
+        return signatures
+
+    def _candidate_pairs(self, bands):
+        '''the pairs of texts sharing a band bucket whose signatures agree on at least `threshold` of the rows'''
+        n, num_perm = self.signatures.shape
+        rows = num_perm // bands
+        pairs = []
+        for band in range(bands):
+            block = np.ascontiguousarray(self.signatures[:, band * rows:(band + 1) * rows])
+            _, bucket = np.unique(block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel(), return_inverse = True)
+            # every member of a bucket is paired with the first member
+            order = np.argsort(bucket, kind = 'stable')
+            sorted_buckets = bucket[order]
+            starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+            first = order[np.repeat(starts, np.diff(np.r_[starts, n]))]
+            linked = first != order
+            if linked.any():
+                pairs.append(np.stack([first[linked], order[linked]], axis = 1))
+        if not pairs:
+            return np.empty((0, 2), dtype = np.int64)
+        pairs = np.unique(np.concatenate(pairs), axis = 0)
+        similarity = (self.signatures[pairs[:, 0]] == self.signatures[pairs[:, 1]]).mean(axis = 1)
+        return pairs[similarity >= self.threshold]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def unique(self):
+        '''Returns a dict with `rows`, the positions of the representatives in input order, and `counts`, the size of
+        each of their clusters.'''
+        result = {}
+        result['rows'] = self.representatives
+        result['counts'] = self.counts
+        return result
+
+    def weights(self):
+        '''the size of the cluster of every text'''
+        return self.counts[np.searchsorted(self.representatives, self.labels)]
+
+    def expand(self, values):
+        '''Scale per-representative results back to every text: `values` is aligned with `unique()['rows']`, the result
+        with the input texts.'''
+        return np.asarray(values)[np.searchsorted(self.representatives, self.labels)]
+
+    def clusters(self, min_size = 2):
+        '''the positions of the texts of every cluster with at least `min_size` texts, largest first'''
+        order = np.argsort(self.labels, kind = 'stable')
+        groups = np.split(order, np.flatnonzero(np.diff(self.labels[order])) + 1) if len(order) else []
+        return sorted((group for group in groups if len(group) >= min_size), key = len, reverse = True)
@@ -0,0 +1,175 @@
+# -*- coding:utf-8 -*-
+
+# Note: Live analytics of a stream. The aggregator subscribes to a `TwitterStreamer` and updates its statistics as each
+# tweet is stored: volume per minute, sources, top words / hashtags / mentions, rolling sentiment and the most engaging
+# tweets. Every update is O(1) amortized and the memory is bounded, and `snapshot()` can be called at any time, so a
+# dashboard never reloads or rescans what was collected.
+
+
+import heapq, threading
+from collections import Counter, deque
+
+from Engagement import TWEET_WEIGHTS
+from HeavyHitters import TweetHeavyHitters
+from LexiconSentiment import LexiconSentiment
+from TweetCleaner import fast_clean
+
+try:
+    from textblob import TextBlob
+except ImportError:
+    TextBlob = None
+
+
+class OnlineAggregator():
+    '''Incremental statistics of the tweets of a stream. Use `attach(streamer)`, or call `add` with each tweet dict.'''
+
+    def __init__(self, minutes = 60
+                , window = 500
+                , capacity = 1000
+                , leaders = 10
+                , stopwords = ()
+                , sentiment = 'fast'
+                , weights = None
+                , sentiment_batch = 200
+                ):
+        '''
+        `minutes`: the number of minutes of volume (and sentiment) kept.
+        `window`: the number of latest tweets in the rolling sentiment average.
+        `capacity`: the number of items kept per kind by the word / hashtag / mention counters, see `TweetHeavyHitters`.
+        `leaders`: the number of most engaging tweets kept.
+        `stopwords`: the words not counted.
+        `sentiment`: 'fast' (`LexiconSentiment`), 'textblob' (`TextBlob(text).sentiment`, slower) or None to skip it.
+        `weights`: the engagement weights of the public metrics, see `Engagement.engagement_scores`.
+        `sentiment_batch`: the texts are scored in batches of this size (or when a snapshot is taken), which keeps the
+                        vectorized scoring cheap per tweet.
+        '''
+        if sentiment not in ('fast', 'textblob', None):
+            raise ValueError("sentiment must be 'fast', 'textblob' or None")
+        if sentiment == 'textblob' and TextBlob is None:
+            raise ImportError('the textblob sentiment needs textblob: pip install textblob')
+        self.sentiment = sentiment
+        self.lexicon = LexiconSentiment() if sentiment == 'fast' else None
+        self.weights = weights or TWEET_WEIGHTS
+        self.minutes = minutes
+        self.sentiment_batch = sentiment_batch
+        self.leaders_cnt = leaders
+        self.lock = threading.Lock()
+
+        self.tweet_cnt = 0
+        self.tag_counts = Counter()
+        self.source_counts = Counter()
+        self.lang_counts = Counter()
+        self.heavy_hitters = TweetHeavyHitters(capacity, stopwords)
+        # minute ("2022-09-20T14:05") -> [tweets, polarity sum], the latest `minutes` of them
+        self.per_minute = {}
+        # the polarity of the latest tweets and their running sum
+        self.window = deque(maxlen = window)
+        self.window_sum = 0.0
+        self.polarity_sum = 0.0
+        # (minute, text) of the tweets waiting for their sentiment
+        self.pending = []
+        # min-heap of (score, id, text) of the most engaging tweets
+        self.leaders = []
+
+    def attach(self, streamer):
+        '''subscribe to a `TwitterStreamer`, every tweet it stores is added'''
+        streamer.add_listener(self.add)
+        return self
+
+    def _minute(self, minute):
+        '''the [tweets, polarity sum] bucket of a minute, None if the minute is older than the ones kept'''
+        bucket = self.per_minute.get(minute)
+        if bucket is None:
+            # a new minute replaces the oldest one, at most once a minute since tweets arrive roughly in order
+            if len(self.per_minute) >= self.minutes:
+                oldest = min(self.per_minute)
+                if minute < oldest:
+                    return None
+                del self.per_minute[oldest]
+            bucket = self.per_minute[minute] = [0, 0.0]
+        return bucket
+
+    def _score_pending(self):
+        '''score the waiting texts in one batch and add their polarity, the lock must be held'''
+        if not self.pending:
+            return
+        texts = [text for _, text in self.pending]
+        if self.sentiment == 'fast':
+            polarities = self.lexicon.score(texts)['polarity'].tolist()
+        else:
+            polarities = [TextBlob(text).sentiment.polarity for text in texts]
+        for (minute, _), polarity in zip(self.pending, polarities):
+            bucket = self.per_minute.get(minute)
+            if bucket is not None:
+                bucket[1] += polarity
+            if len(self.window) == self.window.maxlen:
+                self.window_sum -= self.window[0]
+            self.window.append(polarity)
+            self.window_sum += polarity
+            self.polarity_sum += polarity
+        self.pending = []
+
+    def add(self, tweet, tags = None):
+        '''add one tweet dict; `tags` are the stream rules it matched'''
+        cleaned = fast_clean(tweet.get('text', ''))
+        metrics = tweet.get('public_metrics') or {}
+        score = sum(weight * metrics.get(metric, 0) for metric, weight in self.weights.items())
+        # the minute of the tweet, by its creation time when the stream sends it
+        minute = (tweet.get('created_at') or '')[:16]
+        # counted outside the lock, it has its own
+        self.heavy_hitters.add(tweet, cleaned = cleaned)
+
+        with self.lock:
+            self.tweet_cnt += 1
+            self.tag_counts.update(tags or [])
+            self.source_counts[tweet.get('source')] += 1
+            self.lang_counts[tweet.get('lang')] += 1
+
+            bucket = self._minute(minute) if minute else None
+            if bucket is not None:
+                bucket[0] += 1
+
+            if self.sentiment:
+                # the sentiment is added to the minute of the tweet when its batch is scored
+                self.pending.append((minute, cleaned.split('https')[0]))
+                if len(self.pending) >= self.sentiment_batch:
+                    self._score_pending()
+
+            entry = (score, tweet.get('id'), tweet.get('text'))
+            if len(self.leaders) < self.leaders_cnt:
+                heapq.heappush(self.leaders, entry)
+            elif score > self.leaders[0][0]:
+                heapq.heapreplace(self.leaders, entry)
+
+    def add_many(self, tweets):
+        '''add the tweet dicts of a collection, e.g. to warm up before attaching to a stream'''
+        for tweet in tweets:
+            self.add(tweet)
+
+    def snapshot(self, k = 10):
+        '''The current statistics, as a dict:
+        `tweet_cnt`, `tags` (tweets per stream rule), `volume` (a list of (minute, tweets) for the kept minutes),
+        `sources` / `langs` (the `k` most common), `words` / `hashtags` / `mentions` (the `k` most common, approximate),
+        `sentiment` (the mean polarity of all tweets, of the rolling window, and per minute) and `leaders` (the most
+        engaging tweets, best first).
+        '''
+        with self.lock:
+            self._score_pending()
+            result = {}
+            result['tweet_cnt'] = self.tweet_cnt
+            result['tags'] = dict(self.tag_counts)
+            minutes = sorted(self.per_minute.items())
+            result['volume'] = [(minute, bucket[0]) for minute, bucket in minutes]
+            result['sources'] = self.source_counts.most_common(k)
+            result['langs'] = self.lang_counts.most_common(k)
+            if self.sentiment:
+                sentiment = {}
+                sentiment['mean'] = self.polarity_sum / self.tweet_cnt if self.tweet_cnt else 0.0
+                sentiment['rolling'] = self.window_sum / len(self.window) if self.window else 0.0
+                sentiment['per_minute'] = [(minute, bucket[1] / bucket[0]) for minute, bucket in minutes]
+                result['sentiment'] = sentiment
+            result['leaders'] = [{'id': tweet_id, 'text': text, 'score': score}
+                                 for score, tweet_id, text in sorted(self.leaders, key = lambda entry: entry[0], reverse = True)]
+        for kind in TweetHeavyHitters.KINDS:
+            result[kind] = self.heavy_hitters.most_common(kind, k)
+        return result
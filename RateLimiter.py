@@ -0,0 +1,190 @@
+# -*- coding:utf-8 -*-
+
+# Note: Rate limit handling for `TwitterCollector`. Instead of sleeping 15 minutes whenever `tweepy.TooManyRequests` is raised,
+# every request asks the scheduler for a bearer token that still has budget on its endpoint, and the budget is
+# kept up to date from the `x-rate-limit-*` headers of each response.
+
+
+import re, time, threading, asyncio
+
+import tweepy
+
+
+class RateLimitScheduler():
+    '''Keeps one bucket per (bearer token, endpoint), refilled by the `x-rate-limit-remaining`/`x-rate-limit-reset` headers.
+    Requests are spread over the token with the most remaining budget and only wait when every token is exhausted,
+    and then only until the earliest reset.
+    '''
+
+    # how long to back off after a 429 without rate limit headers
+    DEFAULT_WINDOW = 15 * 60
+
+    def __init__(self, bearer_tokens, reset_margin = 1.0):
+        '''
+        `bearer_tokens`: the list of bearer tokens to spread the requests over.
+        `reset_margin`: seconds added to the reset time before a bucket is used again, to absorb clock skew.
+        '''
+        self.bearer_tokens = list(bearer_tokens)
+        self.reset_margin = reset_margin
+        # (token, endpoint) -> {'limit': int, 'remaining': int, 'reset': epoch seconds}
+        self.buckets = {}
+        self._cond = threading.Condition()
+
+        # number of requests currently waiting for budget
+        self.queue_depth = 0
+        # counters: `waits` is the number of requests that had to wait, `total_wait` the seconds they actually waited
+        self.requests = 0
+        self.throttled = 0
+        self.waits = 0
+        self.total_wait = 0.0
+
+    @staticmethod
+    def endpoint(method, route):
+        '''the rate limit key of a request, ids in the route are replaced so that e.g. all `get_user` calls share one bucket'''
+        return method + ' ' + re.sub(r'/\d{2,}', '/:id', route)
+
+    def _available(self, token, endpoint, now):
+        '''the remaining budget of the bucket, None if nothing is known about it yet'''
+        bucket = self.buckets.get((token, endpoint))
+        if bucket is None:
+            return None
+        if bucket['reset'] + self.reset_margin <= now:
+            # the window has passed, the bucket is full again
+            bucket['remaining'] = bucket['limit']
+            bucket['reset'] = now + self.DEFAULT_WINDOW
+        return bucket['remaining']
+
+    def _try_acquire(self, endpoint):
+        '''Take one request from the best token. Returns (token, 0) on success, or (None, seconds to wait) when all tokens
+        are exhausted. Must be called with the lock held.'''
+        now = time.time()
+        best_token, best_remaining = None, 0
+        for token in self.bearer_tokens:
+            remaining = self._available(token, endpoint, now)
+            if remaining is None:  # unknown buckets are tried first, their headers tell us the budget
+                best_token, best_remaining = token, float('inf')
+                break
+            if remaining > best_remaining:
+                best_token, best_remaining = token, remaining
+        if best_token is not None:
+            bucket = self.buckets.get((best_token, endpoint))
+            if bucket is not None:
+                bucket['remaining'] -= 1
+            self.requests += 1
+            return best_token, 0.0
+
+        # every token is exhausted, wait until the earliest reset only
+        resets = [self.buckets[(token, endpoint)]['reset'] for token in self.bearer_tokens]
+        return None, max(0.0, min(resets) + self.reset_margin - now)
+
+    def acquire(self, endpoint):
+        '''Block until one of the tokens has budget on `endpoint` and return that token.'''
+        with self._cond:
+            self.queue_depth += 1
+            waited = False
+            try:
+                while True:
+                    token, wait = self._try_acquire(endpoint)
+                    if token is not None:
+                        return token
+                    if not waited:
+                        self.waits += 1
+                        waited = True
+                    # woken up by every `update`, only the time spent here counts
+                    start = time.time()
+                    self._cond.wait(timeout = wait)
+                    self.total_wait += time.time() - start
+            finally:
+                self.queue_depth -= 1
+
+    async def acquire_async(self, endpoint):
+        '''Same as `acquire`, but waits with `asyncio.sleep` so the event loop keeps running.'''
+        with self._cond:
+            self.queue_depth += 1
+        waited = False
+        try:
+            while True:
+                with self._cond:
+                    token, wait = self._try_acquire(endpoint)
+                    if token is None and not waited:
+                        self.waits += 1
+                        waited = True
+                if token is not None:
+                    return token
+                start = time.time()
+                await asyncio.sleep(wait)
+                with self._cond:
+                    self.total_wait += time.time() - start
+        finally:
+            with self._cond:
+                self.queue_depth -= 1
+
+    def update(self, token, endpoint, headers, exhausted = False):
+        '''Update the bucket from the response headers.
+        `exhausted`: True for a 429 response, the bucket is then emptied until its reset.
+        '''
+        now = time.time()
+        with self._cond:
+            bucket = self.buckets.setdefault((token, endpoint), {'limit': 1, 'remaining': 1, 'reset': now + self.DEFAULT_WINDOW})
+            if 'x-rate-limit-limit' in headers:
+                bucket['limit'] = int(headers['x-rate-limit-limit'])
+            if 'x-rate-limit-remaining' in headers:
+                bucket['remaining'] = int(headers['x-rate-limit-remaining'])
+            if 'x-rate-limit-reset' in headers:
+                bucket['reset'] = int(headers['x-rate-limit-reset'])
+            if exhausted:
+                self.throttled += 1
+                bucket['remaining'] = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        '''return the queue depth, wait time and per-endpoint budget'''
+        now = time.time()
+        with self._cond:
+            budget = {}
+            for (token, endpoint), bucket in self.buckets.items():
+                entry = budget.setdefault(endpoint, {'remaining': 0, 'limit': 0, 'next_reset_in': None})
+                entry['remaining'] += max(bucket['remaining'], 0)
+                entry['limit'] += bucket['limit']
+                reset_in = max(0.0, bucket['reset'] - now)
+                if entry['next_reset_in'] is None or reset_in < entry['next_reset_in']:
+                    entry['next_reset_in'] = reset_in
+            return {'tokens': len(self.bearer_tokens)
+                    , 'queue_depth': self.queue_depth
+                    , 'requests': self.requests
+                    , 'throttled': self.throttled
+                    , 'waits': self.waits
+                    , 'total_wait': self.total_wait
+                    , 'budget': budget}
+
+
+class ScheduledClient(tweepy.Client):
+    '''A `tweepy.Client` whose requests go through a `RateLimitScheduler`, spread over the scheduler's bearer tokens.'''
+
+    def __init__(self, scheduler, **kwargs):
+        super().__init__(bearer_token = scheduler.bearer_tokens[0], **kwargs)
+        self.scheduler = scheduler
+        # one plain client (and connection pool) per token
+        self._clients = {token: tweepy.Client(bearer_token = token, **kwargs) for token in scheduler.bearer_tokens}
+
+    def close(self):
+        '''close the connection pools of every token'''
+        for client in self._clients.values():
+            client.session.close()
+        self.session.close()
+
+    def request(self, method, route, params = None, json = None, user_auth = False):
+        if user_auth:  # user context requests are not bound to the bearer tokens
+            return super().request(method, route, params = params, json = json, user_auth = user_auth)
+
+        endpoint = self.scheduler.endpoint(method, route)
+        while True:
+            token = self.scheduler.acquire(endpoint)
+            try:
+                response = self._clients[token].request(method, route, params = params, json = json)
+            except tweepy.TooManyRequests as e:
+                # retry on another token, or wait for the reset
+                self.scheduler.update(token, endpoint, e.response.headers, exhausted = True)
+                continue
+            self.scheduler.update(token, endpoint, response.headers)
+            return response
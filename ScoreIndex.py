@@ -0,0 +1,166 @@
+# -*- coding:utf-8 -*-
+
+# Note: A sorted index over per-tweet scores (polarity, subjectivity, engagement, ...), keyed by tweet id. Every column
+# is kept sorted once, so the most negative / most positive tweets, the tweets with a given score and the tweets in a
+# score range are found with a binary search instead of re-sorting the scores and scanning a dict keyed by text, where
+# duplicate texts overwrote each other. New tweets are buffered and merged into the sorted columns on the next query.
+
+
+import numpy as np
+import pandas as pd
+
+
+class ScoreIndex():
+    '''Numeric columns of tweets, sorted per column. Each tweet id has one row; inserting an id again replaces its
+    scores. Queries return a DataFrame with the `id` and the scores, in the order of the queried column; equal scores
+    keep the order the tweets were inserted in.'''
+
+    def __init__(self, columns, ids = None, values = None):
+        '''
+        `columns`: the names of the scores, e.g. ('polarity', 'subjectivity', 'engagement').
+        `ids` / `values`: optional first batch, see `insert`.
+        '''
+        self.columns = list(columns)
+        self.ids = np.empty(0, dtype = np.int64)
+        self.values = {column: np.empty(0) for column in self.columns}
+        self.alive = np.empty(0, dtype = bool)
+        # tweet id -> row
+        self.rows = {}
+        # per column: the rows sorted by score (then by row), their scores, and the number of rows that are not NaN
+        self.sorted_rows = {column: np.empty(0, dtype = np.int64) for column in self.columns}
+        self.sorted_values = {column: np.empty(0) for column in self.columns}
+        self.valid = {column: 0 for column in self.columns}
+        # inserted rows not merged into the sorted columns yet
+        self.pending_ids = []
+        self.pending_values = {column: [] for column in self.columns}
+        self.replaced = False
+        if ids is not None:
+            self.insert(ids, values)
+
+    @classmethod
+    def from_table(cls, table, columns):
+        '''build the index from a DataFrame with an `id` column, e.g. a tweet table with a `polarity` column added'''
+        return cls(columns, table['id'].to_numpy(), {column: table[column].to_numpy() for column in columns})
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, tweet_id):
+        return int(tweet_id) in self.rows
+
+    def insert(self, ids, values):
+        '''Add or replace the scores of tweets, in O(1) per tweet; the sorted columns are updated on the next query.
+        `ids`: the tweet ids.
+        `values`: a dict of column -> scores aligned with `ids`. Missing columns are NaN and never returned by queries.
+        '''
+        ids = [int(tweet_id) for tweet_id in ids]
+        for column in self.columns:
+            column_values = values.get(column)
+            if column_values is None:
+                self.pending_values[column].extend([np.nan] * len(ids))
+            else:
+                column_values = np.asarray(column_values, dtype = np.float64)
+                if len(column_values) != len(ids):
+                    raise ValueError('expected one %s per id' % column)
+                self.pending_values[column].extend(column_values.tolist())
+        first = len(self.ids) + len(self.pending_ids)
+        # extended first, an id repeated within the batch replaces its earlier row of the same batch
+        self.pending_ids.extend(ids)
+        for row, tweet_id in enumerate(ids, first):
+            previous = self.rows.get(tweet_id)
+            if previous is not None:
+                self.replaced = True
+                if previous < len(self.alive):
+                    self.alive[previous] = False
+                else:
+                    # replaced before being merged: the old pending row is dropped at the merge
+                    self.pending_ids[previous - len(self.ids)] = None
+            self.rows[tweet_id] = row
+        return self
+
+    def _merge(self):
+        '''merge the pending rows into the sorted columns and drop the replaced rows'''
+        if not self.pending_ids and not self.replaced:
+            return
+        start = len(self.ids)
+        new_alive = np.array([tweet_id is not None for tweet_id in self.pending_ids], dtype = bool)
+        self.ids = np.concatenate([self.ids, np.array([tweet_id or 0 for tweet_id in self.pending_ids], dtype = np.int64)])
+        self.alive = np.concatenate([self.alive, new_alive])
+        new_rows = np.arange(start, len(self.ids))[new_alive]
+        for column in self.columns:
+            self.values[column] = np.concatenate([self.values[column], np.array(self.pending_values[column], dtype = np.float64)])
+            rows = self.sorted_rows[column]
+            if self.replaced:
+                rows = rows[self.alive[rows]]
+            sorted_values = self.values[column][rows]
+            # the new rows are sorted among themselves, then inserted after the equal scores already in place
+            order = np.argsort(self.values[column][new_rows], kind = 'stable')
+            insert_rows = new_rows[order]
+            insert_values = self.values[column][insert_rows]
+            positions = np.searchsorted(sorted_values, insert_values, side = 'right')
+            self.sorted_rows[column] = np.insert(rows, positions, insert_rows)
+            self.sorted_values[column] = np.insert(sorted_values, positions, insert_values)
+            # NaN is sorted last
+            self.valid[column] = len(self.sorted_values[column]) - int(np.isnan(self.sorted_values[column]).sum())
+            self.pending_values[column] = []
+        self.pending_ids = []
+        self.replaced = False
+
+    def _frame(self, column, rows):
+        result = pd.DataFrame({'id': self.ids[rows]})
+        for name in [column] + [name for name in self.columns if name != column]:
+            result[name] = self.values[name][rows]
+        return result
+
+    def _check(self, column):
+        if column not in self.values:
+            raise KeyError('no column %r in the index' % column)
+        self._merge()
+
+    def top(self, column, k = 10):
+        '''the `k` tweets with the largest scores, largest first'''
+        self._check(column)
+        values = self.sorted_values[column][:self.valid[column]]
+        rows = self.sorted_rows[column][:self.valid[column]]
+        k = min(k, len(values))
+        if k <= 0:
+            return self._frame(column, np.empty(0, dtype = np.int64))
+        # the scores above the k-th one, largest first, then the earliest rows with the k-th score
+        kth = values[-k]
+        lo, hi = np.searchsorted(values, kth, side = 'left'), np.searchsorted(values, kth, side = 'right')
+        above = rows[hi:]
+        above = above[np.lexsort((above, -values[hi:]))]
+        return self._frame(column, np.concatenate([above, rows[lo:lo + k - len(above)]]))
+
+    def bottom(self, column, k = 10):
+        '''the `k` tweets with the smallest scores, smallest first'''
+        self._check(column)
+        return self._frame(column, self.sorted_rows[column][:min(k, self.valid[column])])
+
+    def range(self, column, low = None, high = None):
+        '''the tweets with `low <= score <= high`, by increasing score; either bound may be None'''
+        self._check(column)
+        values = self.sorted_values[column][:self.valid[column]]
+        start = 0 if low is None else np.searchsorted(values, low, side = 'left')
+        end = len(values) if high is None else np.searchsorted(values, high, side = 'right')
+        return self._frame(column, self.sorted_rows[column][start:max(start, end)])
+
+    def equal(self, column, value, tolerance = 1e-9):
+        '''the tweets with a score of `value`, e.g. `equal('polarity', -0.275)`, up to a float `tolerance`'''
+        return self.range(column, value - tolerance, value + tolerance)
+
+    def count(self, column, low = None, high = None):
+        '''the number of tweets with `low <= score <= high`, without building the result'''
+        self._check(column)
+        values = self.sorted_values[column][:self.valid[column]]
+        start = 0 if low is None else np.searchsorted(values, low, side = 'left')
+        end = len(values) if high is None else np.searchsorted(values, high, side = 'right')
+        return int(max(0, end - start))
+
+    def get(self, tweet_id):
+        '''the scores of one tweet as a dict, None if it is not in the index'''
+        row = self.rows.get(int(tweet_id))
+        if row is None:
+            return None
+        self._merge()
+        return {column: float(self.values[column][row]) for column in self.columns}
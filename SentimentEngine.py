@@ -0,0 +1,124 @@
+# -*- coding:utf-8 -*-
+
+# Note: Sentiment scoring of a whole corpus. The texts are deduplicated by the hash of their normalized form, only the
+# texts not seen before are scored, in chunks spread over a process pool, and the results come back as numpy arrays
+# aligned with the input. The cache can be kept in a pickle file so that reruns skip the scoring altogether.
+
+
+import os, pickle, hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from textblob import TextBlob
+except ImportError:
+    TextBlob = None
+
+from LexiconSentiment import LexiconSentiment
+
+
+def normalize_text(text):
+    '''The form of a text used as the cache key. TextBlob ignores the spacing, so texts that differ only in whitespace
+    get the same scores. The case is kept: emoticons such as ":D" are case sensitive.'''
+    return ' '.join(text.split())
+
+
+def _textblob_chunk(texts):
+    '''score one chunk in a worker process, as `TextBlob(text).sentiment` in the analysis'''
+    result = []
+    for text in texts:
+        sentiment = TextBlob(text).sentiment
+        result.append((sentiment.polarity, sentiment.subjectivity))
+    return result
+
+
+class SentimentEngine():
+    '''Polarity and subjectivity of many texts, computed with TextBlob on a process pool and cached by text.'''
+
+    BACKENDS = ('textblob', 'fast')
+
+    def __init__(self, processes = None
+                , chunk_size = 1000
+                , cache_file = None
+                , backend = 'textblob'
+                , lexicon_file = None
+                ):
+        '''
+        `backend`: 'textblob' scores every text with `TextBlob(text).sentiment`, as in the analysis. 'fast' uses
+                `LexiconSentiment`, the same lexicon scored in one vectorized pass, which is an approximation of TextBlob
+                meant for dashboards; it runs in this process.
+        `lexicon_file`: the lexicon of the 'fast' backend, see `LexiconSentiment`.
+        `processes`: the number of worker processes. Defaults to the number of cores; 1 scores in this process.
+        `chunk_size`: the number of texts sent to a worker at once. Small batches (less than one chunk) are scored in
+                    this process, starting the pool would cost more than it saves.
+        `cache_file`: a pickle file keeping the scores between runs. If not specified, the cache lives in memory only.
+                    Use a different file per backend.
+        '''
+        if backend not in self.BACKENDS:
+            raise ValueError('backend must be one of %s' % ', '.join(self.BACKENDS))
+        if backend == 'textblob' and TextBlob is None:
+            raise ImportError('the sentiment engine needs textblob: pip install textblob')
+        self.backend = backend
+        self.lexicon = LexiconSentiment(lexicon_file) if backend == 'fast' else None
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.cache_file = cache_file
+        self.cache = {}
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                self.cache = pickle.load(f)
+        self.hits = 0
+        self.misses = 0
+
+    def _score_missing(self, texts):
+        '''the scores of `texts`, in order, chunked over the pool when there are enough of them'''
+        if self.lexicon is not None:
+            scores = self.lexicon.score(texts)
+            return list(zip(scores['polarity'].tolist(), scores['subjectivity'].tolist()))
+        if self.processes == 1 or len(texts) <= self.chunk_size:
+            return _textblob_chunk(texts)
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers = min(self.processes, len(chunks))) as pool:
+            return [score for chunk in pool.map(_textblob_chunk, chunks) for score in chunk]
+
+    def score(self, texts):
+        '''Score a list of texts.
+        `texts`: plain texts (e.g. `PreprocessedTweets.texts()`, the cleaned text before the first link).
+        Returns a dict with `polarity` and `subjectivity`, float64 arrays aligned with `texts`.
+        '''
+        keys = []
+        missing = {}
+        for text in texts:
+            normalized = normalize_text(text)
+            key = hashlib.sha1(normalized.encode('utf-8')).digest()
+            keys.append(key)
+            if key not in self.cache and key not in missing:
+                missing[key] = normalized
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+
+        if missing:
+            for key, scores in zip(missing, self._score_missing(list(missing.values()))):
+                self.cache[key] = scores
+            if self.cache_file:
+                self.save()
+
+        scores = np.array([self.cache[key] for key in keys], dtype = np.float64).reshape(-1, 2)
+        result = {}
+        result['polarity'] = scores[:, 0]
+        result['subjectivity'] = scores[:, 1]
+        return result
+
+    def save(self):
+        '''write the cache to `cache_file`'''
+        with open(self.cache_file, 'wb') as f:
+            pickle.dump(self.cache, f)
+
+    def stats(self):
+        '''the number of texts answered from the cache and scored, and the size of the cache'''
+        result = {}
+        result['hits'] = self.hits
+        result['misses'] = self.misses
+        result['cached'] = len(self.cache)
+        return result
@@ -0,0 +1,136 @@
+# -*- coding:utf-8 -*-
+
+# Note: Tweet volume over time at minute, hour and day resolution. The `created_at` strings are parsed in one vectorized
+# pass and counted per minute, and the hour and day buckets are rolled up from the new minute buckets only, so
+# appending a new collection never recounts the tweets already added. Optional values (e.g. sentiment polarity) are
+# summed per bucket alongside the counts, and sliding windows and percent changes are read from the buckets.
+
+
+import numpy as np
+import pandas as pd
+
+from TweetTable import tweets_to_frame
+
+
+RESOLUTIONS = {'minute': 'min', 'hour': 'h', 'day': 'D'}
+
+
+def parse_times(timestamps):
+    '''Parse `created_at` values (ISO strings such as "2022-09-28T05:12:31.000Z", datetimes, or a datetime64 column)
+    into a UTC DatetimeIndex in one pass.'''
+    if not isinstance(timestamps, (pd.Series, pd.Index)):
+        timestamps = pd.Series(list(timestamps), dtype = object)
+    return pd.DatetimeIndex(pd.to_datetime(timestamps, utc = True, format = 'ISO8601'))
+
+
+class TweetTimeSeries():
+    '''Counts (and value sums) of tweets per minute, hour and day. Each resolution is a DataFrame indexed by the start
+    of the bucket, with a `count` column and one column per value.'''
+
+    def __init__(self, tweets = None, values = None):
+        '''
+        `tweets`: optional first batch, see `append`.
+        `values`: see `append`.
+        '''
+        self.buckets = {resolution: pd.DataFrame({'count': pd.Series(dtype = np.int64)}
+                                                 , index = pd.DatetimeIndex([], tz = 'UTC'))
+                        for resolution in RESOLUTIONS}
+        self.tweet_cnt = 0
+        if tweets is not None:
+            self.append(tweets, values)
+
+    def append(self, tweets, values = None):
+        '''Add tweets without touching the existing buckets beyond adding the new counts to them.
+        `tweets`: a tweet table from `TweetTable`, tweet dicts (e.g. `json_data['tweets']`) or `created_at` values.
+        `values`: a dict of name -> array aligned with `tweets` (e.g. {'polarity': polarity}), summed per bucket.
+                The same names should be given with every batch.
+        '''
+        if isinstance(tweets, pd.DataFrame):
+            times = tweets['created_at']
+        else:
+            tweets = list(tweets)
+            if tweets and isinstance(tweets[0], dict):
+                times = tweets_to_frame(tweets)['created_at']
+            else:
+                times = tweets
+        times = parse_times(times)
+        if not len(times):
+            return self
+        frame = pd.DataFrame({'count': np.ones(len(times), dtype = np.int64)}, index = times)
+        for name, column in (values or {}).items():
+            frame[name] = np.asarray(column, dtype = np.float64)
+
+        # the new tweets are bucketed per minute, then the new minute buckets are rolled up to hours and days
+        new = frame.groupby(times.floor(RESOLUTIONS['minute'])).sum()
+        for resolution, freq in RESOLUTIONS.items():
+            if resolution != 'minute':
+                new = new.groupby(new.index.floor(freq)).sum()
+            merged = self.buckets[resolution].add(new, fill_value = 0)
+            self.buckets[resolution] = merged.astype({'count': np.int64})
+        self.tweet_cnt += len(times)
+        return self
+
+    def counts(self, resolution = 'day', start = None, end = None, column = 'count', fill = True):
+        '''The buckets of a resolution as a Series, from `start` to `end` (inclusive).
+        `column`: 'count' or the name of a value, e.g. 'polarity' for the polarity sum; use `mean` for averages.
+        `fill`: If True, the buckets without tweets are included with 0.
+        '''
+        if resolution not in RESOLUTIONS:
+            raise ValueError('resolution must be one of %s' % ', '.join(RESOLUTIONS))
+        series = self.buckets[resolution][column]
+        if fill and len(series):
+            series = series.asfreq(RESOLUTIONS[resolution], fill_value = 0)
+        if start is not None or end is not None:
+            series = series.loc[self._time(start):self._time(end)]
+        return series
+
+    def mean(self, column, resolution = 'day', start = None, end = None):
+        '''the average of a value per bucket (e.g. the mean polarity per day), NaN for buckets without tweets'''
+        frame = self.buckets[resolution]
+        series = (frame[column] / frame['count']).asfreq(RESOLUTIONS[resolution]) if len(frame) else frame[column]
+        return series.loc[self._time(start):self._time(end)]
+
+    def sliding(self, window, resolution = 'day', how = 'sum', column = 'count'):
+        '''A sliding window over the buckets, e.g. `sliding('7D')` for the weekly volume at every day.
+        `window`: a number of buckets or a time span ('7D', '3h', ...).
+        `how`: 'sum' or 'mean'.
+        '''
+        rolling = self.counts(resolution, column = column).rolling(window, min_periods = 1)
+        if how == 'sum':
+            return rolling.sum()
+        if how == 'mean':
+            return rolling.mean()
+        raise ValueError("how must be 'sum' or 'mean'")
+
+    def pct_change(self, resolution = 'day', periods = 1, column = 'count'):
+        '''the percent change from one bucket to the bucket `periods` later'''
+        series = self.counts(resolution, column = column).astype(np.float64)
+        return series.pct_change(periods = periods) * 100
+
+    def compare(self, split, resolution = 'day', column = 'count'):
+        '''Compare the volume before and after a point in time, e.g. "did volume drop after two weeks?".
+        `split`: a time, or a span from the first tweet such as '14D'.
+        Returns a dict with the average per bucket `before` and `after` and the `change` in percent.
+        '''
+        series = self.counts(resolution, column = column)
+        if not len(series):
+            raise ValueError('no tweets')
+        try:
+            split = series.index[0] + pd.Timedelta(split)
+        except (ValueError, TypeError):
+            split = self._time(split)
+        before = series[series.index < split]
+        after = series[series.index >= split]
+        result = {}
+        result['split'] = split
+        result['before'] = float(before.mean()) if len(before) else float('nan')
+        result['after'] = float(after.mean()) if len(after) else float('nan')
+        result['change'] = (result['after'] - result['before']) / result['before'] * 100 if result['before'] else float('nan')
+        return result
+
+    @staticmethod
+    def _time(value):
+        if value is None:
+            return None
+        value = pd.Timestamp(value)
+        return value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
@@ -0,0 +1,133 @@
+# -*- coding:utf-8 -*-
+
+# Note: Preprocessing shared by every analysis step. Each tweet is cleaned, stripped of its URL and tokenized once,
+# then word counts, hashtags, mentions, word clouds and sentiment all read from the same structure.
+
+
+import pickle, os, hashlib
+from collections import Counter
+
+try:
+    from cleantext import clean
+except ImportError:  # only needed by the default cleaner, `TweetCleaner.fast_clean` works without it
+    clean = None
+
+from TweetCleaner import table_dp
+
+
+def clean_tweet(text):
+    '''the cleaning used in the analysis: clean the emoji, convert to ascii and lower case'''
+    if clean is None:
+        raise ImportError('the default cleaner needs clean-text: pip install clean-text, or use TweetCleaner.fast_clean')
+    return clean(text, no_emoji=True)
+
+
+def preprocess_text(text, cleaner = clean_tweet, cleaned = None):
+    '''Clean and tokenize one tweet. `cleaned` skips the cleaning when the text was already cleaned. Returns a dict with
+    `cleaned`: the cleaned text.
+    `text`: the cleaned text before the first link, used for sentiment.
+    `words`: the words of the text before the first link, with digits and punctuation removed.
+    `words_lower`: the same words in lower case.
+    `hashtags` / `mentions`: the tokens of the cleaned text containing "#" / "@".
+    '''
+    if cleaned is None:
+        cleaned = cleaner(text)
+    words = cleaned.split("http")[0].translate(table_dp).split()
+    tokens = cleaned.split()
+    result = {}
+    result['cleaned'] = cleaned
+    result['text'] = cleaned.split('https')[0]
+    result['words'] = words
+    result['words_lower'] = [word.lower() for word in words]
+    result['hashtags'] = [token for token in tokens if "#" in token]
+    result['mentions'] = [token for token in tokens if "@" in token]
+    return result
+
+
+class PreprocessedTweets():
+    '''The preprocessed form of a list of tweets, aligned with it: `self.items[i]` belongs to `tweets[i]`.
+    The results are cached by the hash of the raw text, so duplicate texts are processed once, and the cache can be
+    kept in a pickle file so that reruns of the analysis skip the cleaning altogether.
+    '''
+
+    def __init__(self, tweets, cleaner = clean_tweet, cache_file = None, batch_cleaner = None):
+        '''
+        `tweets`: the tweet dicts (e.g. `json_data['tweets']`) or plain texts.
+        `cleaner`: the function cleaning one text. Defaults to `clean(text, no_emoji=True)`.
+        `batch_cleaner`: a function cleaning a list of texts at once (e.g. `TweetCleaner.fast_clean_batch`).
+                    If specified, it is used instead of `cleaner`.
+        `cache_file`: a pickle file keeping the preprocessed texts between runs. If not specified, nothing is saved.
+                    Use a different file per cleaner.
+        '''
+        self.cache_file = cache_file
+        self.cache = {}
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'rb') as f:
+                self.cache = pickle.load(f)
+
+        self.ids = []
+        keys = []
+        missing = {}
+        for tweet in tweets:
+            if isinstance(tweet, dict):
+                text = tweet['text']
+                self.ids.append(tweet.get('id'))
+            else:
+                text = tweet
+                self.ids.append(None)
+            key = hashlib.sha1(text.encode('utf-8')).digest()
+            keys.append(key)
+            if key not in self.cache:
+                missing[key] = text
+        self.misses = len(missing)
+        self.hits = len(keys) - self.misses
+
+        # only the texts not seen before are cleaned
+        if batch_cleaner is not None:
+            for key, cleaned in zip(missing, batch_cleaner(list(missing.values()))):
+                self.cache[key] = preprocess_text(missing[key], cleaned = cleaned)
+        else:
+            for key, text in missing.items():
+                self.cache[key] = preprocess_text(text, cleaner)
+        self.items = [self.cache[key] for key in keys]
+
+        if cache_file and self.misses:
+            with open(cache_file, 'wb') as f:
+                pickle.dump(self.cache, f)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def texts(self):
+        '''the cleaned texts before the first link, e.g. for sentiment analysis'''
+        return [item['text'] for item in self.items]
+
+    def word_list(self):
+        '''all the words of all tweets, stopwords included'''
+        return [word for item in self.items for word in item['words']]
+
+    def filtered_words(self, stopwords = (), min_len = 3):
+        '''the lower case words that are not stopwords and have at least `min_len` characters'''
+        stopwords = set(stopwords)
+        return [word.lower() for item in self.items for word in item['words'] if word not in stopwords and len(word) >= min_len]
+
+    def word_counts(self, stopwords = None, min_len = 3):
+        '''Counter of the words. Without `stopwords` every word is counted as is, otherwise see `filtered_words`.'''
+        if stopwords is None:
+            return Counter(self.word_list())
+        return Counter(self.filtered_words(stopwords, min_len))
+
+    def hashtag_counts(self):
+        '''Counter of the tokens containing "#"'''
+        return Counter(tag for item in self.items for tag in item['hashtags'])
+
+    def mention_counts(self):
+        '''Counter of the tokens containing "@"'''
+        return Counter(mention for item in self.items for mention in item['mentions'])
+
+    def wordcloud_text(self, stopwords = (), min_len = 3):
+        '''the filtered words joined into one string for `WordCloud.generate`'''
+        return ' '.join(self.filtered_words(stopwords, min_len))
@@ -0,0 +1,291 @@
+# -*- coding:utf-8 -*-
+
+# Note: A local search engine over the collected tweets, so follow-up questions are answered from disk instead of
+# spending API quota on `fetch_recent_tweets` again. Terms, hashtags, mentions, authors, languages and tweet types are
+# kept in an inverted index (term -> sorted tweet numbers), and queries use a subset of the Twitter API v2 syntax:
+#     "born pink" lisa              both, the quoted words next to each other
+#     shutdown OR "pink venom"      either
+#     #bornpink -is:retweet lang:en hashtags, negation, operators
+#     (lisa OR jennie) -wts         grouping
+# The operators are `lang:`, `from:` (author id, or username after `add_authors`), `is:retweet`, `is:reply`,
+# `is:quote`, `has:links`, `has:hashtags`, `has:mentions`; the date range is given as `start_time` / `end_time` like
+# in `fetch_recent_tweets`. New collection files are added incrementally with `refresh`.
+
+
+import os, re, glob, pickle
+
+import numpy as np
+import pandas as pd
+
+from Entities import extract_entities
+from TweetCleaner import fast_clean, strip_urls
+from TweetSink import load_collection, iter_tweets, read_manifest
+
+
+WORD_REGEX = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+QUERY_REGEX = re.compile(r'-?\(|\)|-?"[^"]*"|[^\s()"]+')
+OPERATORS = ('lang', 'from', 'is', 'has')
+
+
+def text_words(text):
+    '''the words indexed for a text: cleaned, without links, hashtag and mention signs dropped'''
+    return WORD_REGEX.findall(strip_urls(fast_clean(text)))
+
+
+def _contains_sorted(haystack, needles):
+    '''mask of the `needles` found in the sorted array `haystack`, by binary search'''
+    if not len(haystack):
+        return np.zeros(len(needles), dtype = bool)
+    positions = np.minimum(np.searchsorted(haystack, needles), len(haystack) - 1)
+    return haystack[positions] == needles
+
+
+class TweetSearchIndex():
+    '''An inverted index over tweet dicts. Tweets are numbered in the order they are added, a tweet id is only added
+    once, and every posting list is sorted by construction.'''
+
+    def __init__(self):
+        self.postings = {}
+        # numpy copies of the posting lists, rebuilt for a term after it got new tweets
+        self.arrays = {}
+        self.ids = []
+        self.created = []
+        # the indexed words of each tweet joined by spaces, to check phrases
+        self.phrases = []
+        self.numbers = {}
+        self.usernames = {}
+        # path -> (mtime, size) of the collection files and manifest parts read by `refresh`
+        self.files = {}
+        self._created = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _post(self, term, number):
+        postings = self.postings.get(term)
+        if postings is None:
+            postings = self.postings[term] = []
+        elif postings[-1] == number:
+            return
+        postings.append(number)
+        self.arrays.pop(term, None)
+
+    def add_tweets(self, tweets):
+        '''Index tweet dicts (e.g. `json_data['tweets']`). Tweets already indexed are skipped.
+        Returns the number of tweets added.'''
+        added = 0
+        for tweet in tweets:
+            tweet_id = str(tweet['id'])
+            if tweet_id in self.numbers:
+                continue
+            number = len(self.ids)
+            self.numbers[tweet_id] = number
+            self.ids.append(tweet_id)
+            self.created.append(tweet.get('created_at'))
+            words = text_words(tweet.get('text', ''))
+            self.phrases.append(' ' + ' '.join(words) + ' ')
+            for word in words:
+                self._post(word, number)
+            entities = extract_entities(tweet)
+            for entity_type, values in entities.items():
+                for value in values:
+                    if entity_type != 'domains':
+                        self._post(value, number)
+                if values and entity_type in ('urls', 'hashtags', 'mentions'):
+                    self._post('has:' + ('links' if entity_type == 'urls' else entity_type), number)
+            if tweet.get('author_id'):
+                self._post('from:' + str(tweet['author_id']), number)
+            if tweet.get('lang'):
+                self._post('lang:' + tweet['lang'].lower(), number)
+            for reference in tweet.get('referenced_tweets') or []:
+                kind = {'retweeted': 'retweet', 'replied_to': 'reply', 'quoted': 'quote'}.get(reference.get('type'))
+                if kind:
+                    self._post('is:' + kind, number)
+            added += 1
+        return added
+
+    def add_authors(self, authors):
+        '''Map usernames to author ids for `from:username`. `authors`: user objects, e.g. `author_info_list`.'''
+        for author in authors:
+            if author:
+                self.usernames[author['username'].lower()] = str(author['id'])
+
+    def add_file(self, file_name):
+        '''Index a collection file: a json collection (e.g. `bp.json`) or a jsonl manifest. Returns the tweets added.'''
+        if file_name.endswith('.manifest.json'):
+            return self.add_tweets(iter_tweets(file_name))
+        return self.add_tweets(load_collection(file_name)['tweets'])
+
+    def refresh(self, directory = '.', pattern = '*.json'):
+        '''Index the collection files of a directory that are new or changed since the last refresh.
+        For a jsonl manifest every part is tracked on its own, so a collection still being written is indexed
+        incrementally as its parts grow. Returns the number of tweets added.'''
+        added = 0
+        for file_name in sorted(glob.glob(os.path.join(directory, pattern))):
+            try:
+                if file_name.endswith('.manifest.json'):
+                    folder = os.path.dirname(file_name)
+                    for part in read_manifest(file_name)['parts']:
+                        path = os.path.join(folder, part)
+                        if os.path.exists(path) and self._changed(path):
+                            # a part read before is read again, the tweets already indexed are skipped
+                            added += self.add_tweets(iter_tweets(file_name, parts = [part]))
+                            self._seen(path)
+                elif self._changed(file_name):
+                    collection = load_collection(file_name)
+                    # other json files, e.g. author_info_list.json, are not collections
+                    if isinstance(collection, dict) and 'tweets' in collection:
+                        added += self.add_tweets(collection['tweets'])
+                    self._seen(file_name)
+            except ValueError as e:
+                print('Skipped', file_name, '-', e)
+        return added
+
+    def _changed(self, path):
+        stat = os.stat(path)
+        return self.files.get(path) != (stat.st_mtime, stat.st_size)
+
+    def _seen(self, path):
+        stat = os.stat(path)
+        self.files[path] = (stat.st_mtime, stat.st_size)
+
+    def _array(self, term):
+        array = self.arrays.get(term)
+        if array is None:
+            array = self.arrays[term] = np.array(self.postings.get(term, []), dtype = np.int64)
+        return array
+
+    def _all(self):
+        return np.arange(len(self.ids), dtype = np.int64)
+
+    # the query is parsed by recursive descent: OR of ANDs of (negated) atoms, AND binding first as in the API
+
+    def _parse_or(self, tokens):
+        result = self._parse_and(tokens)
+        while tokens and tokens[0] == 'OR':
+            tokens.pop(0)
+            other = self._parse_and(tokens)
+            mask = np.zeros(len(self.ids), dtype = bool)
+            mask[result] = True
+            mask[other] = True
+            result = np.flatnonzero(mask)
+        return result
+
+    def _parse_and(self, tokens):
+        positive = []
+        negative = []
+        while tokens and tokens[0] not in ('OR', ')'):
+            token = tokens.pop(0)
+            negated = token.startswith('-') and len(token) > 1
+            if negated:
+                token = token[1:]
+            if token == '(':
+                matches = self._parse_or(tokens)
+                if not tokens or tokens.pop(0) != ')':
+                    raise ValueError('missing ")" in the query')
+            else:
+                matches = self._atom(token)
+            (negative if negated else positive).append(matches)
+        if not positive and not negative:
+            raise ValueError('empty clause in the query')
+        # the smallest list first, every other one is searched by binary search
+        positive.sort(key = len)
+        result = positive[0] if positive else self._all()
+        for matches in positive[1:]:
+            result = result[_contains_sorted(matches, result)]
+        for matches in negative:
+            result = result[~_contains_sorted(matches, result)]
+        return result
+
+    def _atom(self, token):
+        if token.startswith('"'):
+            return self._phrase(text_words(token.strip('"')), token)
+        operator, _, value = token.partition(':')
+        if value and operator in OPERATORS:
+            value = value.lower()
+            if operator == 'from':
+                value = self.usernames.get(value.lstrip('@'), value.lstrip('@'))
+            return self._array(operator + ':' + value)
+        if token[0] in '#@$':
+            return self._array(token[0] + token[1:].casefold())
+        words = text_words(token)
+        if len(words) == 1:
+            return self._array(words[0])
+        return self._phrase(words, token)
+
+    def _phrase(self, words, token):
+        if not words:
+            # e.g. "!!", nothing of it is indexed
+            raise ValueError('no words to search in %s' % token)
+        candidates = self._parse_and(list(words)) if len(words) > 1 else self._array(words[0])
+        if len(words) == 1:
+            return candidates
+        phrase = ' ' + ' '.join(words) + ' '
+        return np.array([number for number in candidates.tolist() if phrase in self.phrases[number]], dtype = np.int64)
+
+    def search(self, query
+                , start_time = None
+                , end_time = None
+                , limit = None
+                ):
+        '''Find the indexed tweets matching a query.
+        `query`: the search rules, see the note at the top of this file.
+        `start_time` / `end_time`: the oldest / newest creation time, as datetimes or ISO strings (UTC if no timezone).
+        `limit`: the maximum number of tweet ids returned, newest first. All of them if not specified.
+        Returns a dict with `ids` (tweet ids, newest first) and `count` (the number of matches, before `limit`).
+        '''
+        tokens = QUERY_REGEX.findall(query)
+        if not tokens:
+            raise ValueError('empty query')
+        numbers = self._parse_or(tokens)
+        if tokens:
+            raise ValueError('unexpected %r in the query' % tokens[0])
+
+        created = self._created_times()
+        if start_time is not None:
+            numbers = numbers[created[numbers] >= self._time(start_time)]
+        if end_time is not None:
+            numbers = numbers[created[numbers] <= self._time(end_time)]
+        order = np.argsort(-created[numbers], kind = 'stable')
+        if limit is not None:
+            order = order[:limit]
+        result = {}
+        result['ids'] = [self.ids[number] for number in numbers[order].tolist()]
+        result['count'] = len(numbers)
+        return result
+
+    def count(self, query, start_time = None, end_time = None):
+        '''the number of indexed tweets matching a query'''
+        return self.search(query, start_time, end_time, limit = 0)['count']
+
+    def _created_times(self):
+        '''the creation times as int64 nanoseconds since the epoch, tweets without one count as the oldest.
+        Only the times of the tweets added since the last search are parsed.'''
+        if self._created is None:
+            self._created = np.empty(0, dtype = np.int64)
+        if len(self._created) < len(self.ids):
+            times = pd.to_datetime(pd.Series(self.created[len(self._created):], dtype = object), utc = True, format = 'ISO8601')
+            # NaT becomes the smallest int64
+            new = times.dt.tz_localize(None).to_numpy(dtype = 'datetime64[ns]').astype(np.int64)
+            self._created = np.concatenate([self._created, new])
+        return self._created
+
+    @staticmethod
+    def _time(value):
+        value = pd.Timestamp(value)
+        value = value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
+        return value.as_unit('ns').value
+
+    def save(self, index_file):
+        '''write the index to a pickle file'''
+        self.arrays = {}
+        with open(index_file, 'wb') as f:
+            pickle.dump(self.__dict__, f)
+
+    @classmethod
+    def load(cls, index_file):
+        '''read an index written by `save`; `refresh` then only adds the files that changed since'''
+        index = cls()
+        with open(index_file, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
@@ -0,0 +1,285 @@
+# -*- coding:utf-8 -*-
+
+# Note: Sinks write collected tweets to disk as they arrive, instead of keeping them all in a list
+# and dumping one big json file at the end. Used by `TwitterCollector` and `TwitterStreamer`.
+
+
+import json, os, gzip
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+
+class TweetSink():
+    '''Base class of the sinks. A sink receives every tweet through `write`, is flushed after every page (search) or
+    every 100 tweets (stream), and is closed once with the collection meta data.
+    The collectors also read these attributes, set by `__init__`:
+    `base_name`: the path of the collection without extension, e.g. `data/bp`.
+    `manifest_file`: the file the manifest is written to, returned in the result as `manifest`.
+    `parts`: the files written so far, recorded in the checkpoints of `fetch_recent_tweets(resume=True)`.
+    `tweet_cnt`: the number of tweets written. A resumed collection sets it to the tweets already on disk.
+    Resuming reads the tweets already collected back with `iter_tweets(manifest_file)`, so it needs a sink writing
+    the `JsonlSink` layout.
+    '''
+
+    def __init__(self, base_name):
+        self.base_name = base_name
+        self.manifest_file = base_name + '.manifest.json'
+        self.parts = []
+        self.tweet_cnt = 0
+
+    def write(self, tweet):
+        '''store one tweet (the `tweet.data` dict)'''
+        raise NotImplementedError
+
+    def write_includes(self, includes):
+        '''store the expanded objects of the tweets, `includes` is a dict of kind (`users`, `tweets`, ...) -> {id: data}'''
+        raise NotImplementedError
+
+    def flush(self):
+        '''push the buffered tweets to disk, nothing to do by default'''
+        pass
+
+    def close(self, meta = None):
+        '''finish the collection, `meta` holds the collection information (collection_type, query, ...). Returns the manifest.'''
+        raise NotImplementedError
+
+
+class JsonlSink(TweetSink):
+    '''Appends each tweet as one compact json line.
+    The tweets go to `<name>.00000.jsonl`, `<name>.00001.jsonl`, ... and a small `<name>.manifest.json`
+    replaces the `collection_type`/`query`/`tweet_cnt` wrapper of the json files.
+    The expanded objects (`includes`) go to `<name>.includes.00000.jsonl`, ..., one object per line.
+    '''
+
+    EXTENSIONS = {None: '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+    def __init__(self, file_name
+                    , save_dir = None
+                    , compression = None
+                    , max_bytes = None
+                    , append = False
+                    ):
+        '''
+        `file_name`: the base name of the files, e.g. `bp` or `bp.jsonl`.
+        `save_dir`: The directory you want to save the files. If not specified, the files will be written in the same directory.
+        `compression`: None, 'gzip' or 'zstd' (needs the `zstandard` package).
+        `max_bytes`: start a new part file once a part holds this many (uncompressed) bytes. If not specified, there is a single part.
+        `append`: If True, continue an existing collection with the same name instead of overwriting it.
+        '''
+        if compression not in self.EXTENSIONS:
+            raise ValueError('Unknown compression: %s' % compression)
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstd compression needs the zstandard package: pip install zstandard')
+
+        for ext in ('.jsonl', '.json'):
+            if file_name.endswith(ext):
+                file_name = file_name[:-len(ext)]
+        if save_dir:
+            if not os.path.exists(save_dir):  # make sure the directory exists
+                os.makedirs(save_dir)
+            file_name = os.path.join(save_dir, file_name)
+
+        super().__init__(file_name)
+        self.compression = compression
+        self.max_bytes = max_bytes
+
+        self.include_parts = []
+        self.part_bytes = 0
+        self._file = None
+        self._raw = None
+        self._includes_file = None
+        self._includes_raw = None
+        # (kind, id) of the objects written by `write_includes`, each is only written once
+        self._included = set()
+        self.meta = {}
+
+        if append and os.path.exists(self.manifest_file):
+            manifest = read_manifest(self.manifest_file)
+            self.parts = manifest['parts']
+            self.include_parts = manifest.get('include_parts', [])
+            self.tweet_cnt = manifest['tweet_cnt']
+            self.meta = {k: v for k, v in manifest.items() if k not in ('parts', 'include_parts', 'tweet_cnt', 'status', 'compression')}
+        elif os.path.exists(self.manifest_file):
+            # a fresh collection must not mix with parts of an older one
+            manifest = read_manifest(self.manifest_file)
+            for part in manifest['parts'] + manifest.get('include_parts', []):
+                part_file = os.path.join(os.path.dirname(self.manifest_file), part)
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+        # a new part is always started (on the first write), compressed files cannot be safely appended after a crash
+        self._write_manifest('running')
+
+    def _part_name(self, index):
+        return '%s.%05d%s' % (self.base_name, index, self.EXTENSIONS[self.compression])
+
+    def _open_file(self, path):
+        '''open a part for writing, returns the (compressed) file and the raw file under it, if any'''
+        if self.compression == 'gzip':
+            return gzip.open(path, 'wb'), None
+        if self.compression == 'zstd':
+            raw = open(path, 'wb')
+            return zstandard.ZstdCompressor().stream_writer(raw), raw
+        return open(path, 'wb'), None
+
+    def _open_part(self):
+        '''close the current part and start the next one'''
+        self._close_part()
+        path = self._part_name(len(self.parts))
+        self.parts.append(os.path.basename(path))
+        self._file, self._raw = self._open_file(path)
+        self.part_bytes = 0
+
+    def _close_part(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+    def _close_includes(self):
+        if self._includes_file is not None:
+            self._includes_file.close()
+            self._includes_file = None
+        if self._includes_raw is not None:
+            self._includes_raw.close()
+            self._includes_raw = None
+
+    def _write_manifest(self, status):
+        manifest = dict(self.meta)
+        manifest['tweet_cnt'] = self.tweet_cnt
+        manifest['compression'] = self.compression
+        manifest['parts'] = self.parts
+        if self.include_parts:
+            manifest['include_parts'] = self.include_parts
+        manifest['status'] = status
+        # write to a temporary file first so a crash never leaves a broken manifest behind
+        with open(self.manifest_file + '.tmp', 'w', encoding = 'utf-8') as w:
+            w.write(json.dumps(manifest, indent=4))
+        os.replace(self.manifest_file + '.tmp', self.manifest_file)
+        return manifest
+
+    def write(self, tweet):
+        '''append one tweet as a json line'''
+        line = (json.dumps(tweet, separators = (',', ':')) + '\n').encode('utf-8')
+        if self._file is None or (self.max_bytes and self.part_bytes and self.part_bytes + len(line) > self.max_bytes):
+            self._open_part()
+            self._write_manifest('running')
+        self._file.write(line)
+        self.part_bytes += len(line)
+        self.tweet_cnt += 1
+
+    def write_includes(self, includes):
+        '''append the expanded objects not written yet, each as a json line `{"kind": ..., "id": ..., "data": ...}`.
+        Like the tweet parts, a new includes part is started by every sink, so an appended collection may repeat
+        a few objects; `load_includes` keeps one per id.
+        '''
+        for kind, objects in includes.items():
+            for key, data in objects.items():
+                if (kind, key) in self._included:
+                    continue
+                self._included.add((kind, key))
+                if self._includes_file is None:
+                    path = '%s.includes.%05d%s' % (self.base_name, len(self.include_parts), self.EXTENSIONS[self.compression])
+                    self.include_parts.append(os.path.basename(path))
+                    self._includes_file, self._includes_raw = self._open_file(path)
+                    self._write_manifest('running')
+                line = {'kind': kind, 'id': key, 'data': data}
+                self._includes_file.write((json.dumps(line, separators = (',', ':')) + '\n').encode('utf-8'))
+
+    def flush(self):
+        '''push the buffered lines to disk and record the progress in the manifest'''
+        if self._file is not None:
+            self._file.flush()
+        if self._includes_file is not None:
+            self._includes_file.flush()
+        return self._write_manifest('running')
+
+    def close(self, meta = None):
+        '''close the last part and write the final manifest'''
+        if meta:
+            self.meta.update(meta)
+        self._close_part()
+        self._close_includes()
+        return self._write_manifest('complete')
+
+
+def read_manifest(manifest_file):
+    '''read the manifest of a jsonl collection'''
+    with open(manifest_file, encoding = 'utf-8') as f:
+        return json.load(f)
+
+
+def _open_part(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError('reading zstd files needs the zstandard package: pip install zstandard')
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd = True)
+    return open(path, 'rb')
+
+
+def _iter_lines(manifest_file, parts):
+    '''yield the json lines of the `parts` of a jsonl collection'''
+    directory = os.path.dirname(manifest_file)
+    for part in parts:
+        path = os.path.join(directory, part)
+        if not os.path.exists(path):
+            continue
+        with _open_part(path) as f:
+            buffer = b''
+            while True:
+                try:
+                    chunk = f.read(1 << 20)
+                except EOFError:  # truncated compressed part
+                    break
+                if not chunk:
+                    break
+                buffer += chunk
+                lines = buffer.split(b'\n')
+                buffer = lines.pop()
+                for line in lines:
+                    if line:
+                        yield json.loads(line)
+            if buffer.strip():
+                try:
+                    yield json.loads(buffer)
+                except ValueError:
+                    pass
+
+
+def iter_tweets(manifest_file, parts = None):
+    '''Yield the tweets of a jsonl collection one by one, so memory stays flat.
+    A line cut off by a crash at the end of a part is skipped.
+    `parts`: only read these parts of the manifest, all of them if not specified.
+    '''
+    return _iter_lines(manifest_file, read_manifest(manifest_file)['parts'] if parts is None else parts)
+
+
+def load_includes(manifest_file):
+    '''Read the expanded objects of a jsonl collection (see `JsonlSink.write_includes`),
+    as `users`, `tweets`, `places` and `media` dicts keyed by id like `result['includes']`.
+    '''
+    includes = {'users': {}, 'tweets': {}, 'places': {}, 'media': {}}
+    for line in _iter_lines(manifest_file, read_manifest(manifest_file).get('include_parts', [])):
+        includes.setdefault(line['kind'], {})[line['id']] = line['data']
+    return includes
+
+
+def load_collection(file_name):
+    '''Load a collection saved by `TwitterCollector`/`TwitterStreamer`, either a json file or a jsonl manifest,
+    and return it in the json layout (`collection_type`, `query`, `tweet_cnt`, `tweets`, ...).
+    '''
+    if file_name.endswith('.manifest.json'):
+        result = read_manifest(file_name)
+        result['tweets'] = list(iter_tweets(file_name))
+        result['tweet_cnt'] = len(result['tweets'])
+        if 'include_parts' in result:
+            result['includes'] = load_includes(file_name)
+        return result
+    with open(file_name, encoding = 'utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,129 @@
+# -*- coding:utf-8 -*-
+
+# Note: Columnar tables of tweets and authors. A collection file (json or jsonl manifest) is converted once into a
+# pandas DataFrame with typed columns (int64 ids, datetime64 timestamps, integer metrics, categorical source/lang),
+# and the table is cached next to the collection so that reloading it takes milliseconds. Aggregations can then be
+# vectorized instead of walking `json_data['tweets'][i][...]` in Python loops.
+
+
+import os, json
+
+import numpy as np
+import pandas as pd
+
+from TweetSink import load_collection, iter_tweets, read_manifest
+
+
+TWEET_METRICS = ['retweet_count', 'reply_count', 'like_count', 'quote_count']
+AUTHOR_METRICS = ['followers_count', 'following_count', 'tweet_count', 'listed_count']
+
+
+def tweets_to_frame(tweets):
+    '''Convert tweet dicts (e.g. `json_data['tweets']`) into a DataFrame, one row per tweet in the same order.'''
+    ids, author_ids, created_at, texts, sources, langs, sensitive = [], [], [], [], [], [], []
+    retweets, replies, quotes = [], [], []
+    metrics = {metric: [] for metric in TWEET_METRICS}
+    for tweet in tweets:
+        ids.append(int(tweet['id']))
+        author_ids.append(int(tweet.get('author_id') or -1))
+        created_at.append(tweet.get('created_at'))
+        texts.append(tweet.get('text', ''))
+        sources.append(tweet.get('source'))
+        langs.append(tweet.get('lang'))
+        sensitive.append(bool(tweet.get('possibly_sensitive', False)))
+        public_metrics = tweet.get('public_metrics') or {}
+        for metric in TWEET_METRICS:
+            metrics[metric].append(public_metrics.get(metric, 0))
+        kinds = {reference['type'] for reference in tweet.get('referenced_tweets') or []}
+        retweets.append('retweeted' in kinds)
+        replies.append('replied_to' in kinds)
+        quotes.append('quoted' in kinds)
+
+    frame = pd.DataFrame({
+        'id': np.array(ids, dtype = np.int64),
+        'author_id': np.array(author_ids, dtype = np.int64),
+        'created_at': pd.to_datetime(pd.Series(created_at, dtype = object), utc = True, format = 'ISO8601'),
+        'text': pd.Series(texts, dtype = object),
+        'source': pd.Categorical(sources),
+        'lang': pd.Categorical(langs),
+        'possibly_sensitive': np.array(sensitive, dtype = bool),
+        'is_retweet': np.array(retweets, dtype = bool),
+        'is_reply': np.array(replies, dtype = bool),
+        'is_quote': np.array(quotes, dtype = bool),
+    })
+    for metric in TWEET_METRICS:
+        frame[metric] = np.array(metrics[metric], dtype = np.int64)
+    return frame
+
+
+def authors_to_frame(authors):
+    '''Convert user objects (e.g. `author_info_list`) into a DataFrame, one row per author. `None` entries are skipped.'''
+    authors = [author for author in authors if author]
+    frame = pd.DataFrame({
+        'id': np.array([int(author['id']) for author in authors], dtype = np.int64),
+        'username': pd.Series([author.get('username') for author in authors], dtype = object),
+        'name': pd.Series([author.get('name') for author in authors], dtype = object),
+        'created_at': pd.to_datetime(pd.Series([author.get('created_at') for author in authors], dtype = object), utc = True, format = 'ISO8601'),
+        'verified': np.array([bool(author.get('verified', False)) for author in authors], dtype = bool),
+        'location': pd.Series([author.get('location') for author in authors], dtype = object),
+    })
+    for metric in AUTHOR_METRICS:
+        frame[metric] = np.array([(author.get('public_metrics') or {}).get(metric, 0) for author in authors], dtype = np.int64)
+    return frame
+
+
+def _source_mtime(file_name):
+    '''the last modification of a collection, for a manifest the newest of the manifest and its parts'''
+    mtime = os.path.getmtime(file_name)
+    if file_name.endswith('.manifest.json'):
+        directory = os.path.dirname(file_name)
+        for part in read_manifest(file_name)['parts']:
+            path = os.path.join(directory, part)
+            if os.path.exists(path):
+                mtime = max(mtime, os.path.getmtime(path))
+    return mtime
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def load_tweet_table(file_name, cache = True, kind = 'tweets'):
+    '''Load a collection as a DataFrame.
+    `file_name`: a json collection (e.g. `bp.json`), a jsonl manifest, or for `kind='authors'` a json list of user objects
+                (e.g. `author_info_list.json`).
+    `cache`: If True, the table is saved next to the file (`<file>.parquet`, or `<file>.pkl` without pyarrow) and reused
+            as long as the file has not been modified since.
+    `kind`: 'tweets' or 'authors'.
+    '''
+    if kind not in ('tweets', 'authors'):
+        raise ValueError("kind must be 'tweets' or 'authors'")
+    use_parquet = _parquet_available()
+    cache_file = file_name + ('.parquet' if use_parquet else '.pkl')
+
+    if cache and os.path.exists(cache_file) and os.path.getmtime(cache_file) >= _source_mtime(file_name):
+        return pd.read_parquet(cache_file) if use_parquet else pd.read_pickle(cache_file)
+
+    if kind == 'authors':
+        with open(file_name, encoding = 'utf-8') as f:
+            frame = authors_to_frame(json.load(f))
+    elif file_name.endswith('.manifest.json'):
+        frame = tweets_to_frame(iter_tweets(file_name))
+    else:
+        frame = tweets_to_frame(load_collection(file_name)['tweets'])
+
+    if cache:
+        if use_parquet:
+            frame.to_parquet(cache_file, index = False)
+        else:
+            frame.to_pickle(cache_file)
+    return frame
+
+
+def load_author_table(file_name, cache = True):
+    '''Load a json list of user objects (e.g. `author_info_list.json`) as a DataFrame, see `load_tweet_table`.'''
+    return load_tweet_table(file_name, cache = cache, kind = 'authors')
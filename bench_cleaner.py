@@ -0,0 +1,59 @@
+# -*- coding:utf-8 -*-
+
+# Note: Benchmark of `TweetCleaner` against `clean(text, no_emoji=True)`, with the share of texts both clean the same.
+# Usage: python bench_cleaner.py [--corpus bp.json] [--repeat 3]
+# Without a corpus, the user descriptions of `author_info_list.json` are used as sample texts.
+# The equivalence itself is tested in `test_cleaner.py`.
+
+
+import argparse, json, time
+
+from cleantext import clean
+
+from TweetCleaner import fast_clean, words, words_batch
+from TweetSink import load_collection
+
+
+def timed(label, function, repeat, n):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    print('%-35s %8.3f s  %8.1f us/text' % (label, best, best / n * 1e6))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare TweetCleaner with clean-text.')
+    parser.add_argument('--corpus', default = None, help = 'a collection file such as bp.json')
+    parser.add_argument('--authors', default = 'author_info_list.json', help = 'sample texts when no corpus is given')
+    parser.add_argument('--repeat', type = int, default = 3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        texts = [tweet['text'] for tweet in load_collection(args.corpus)['tweets']]
+    else:
+        with open(args.authors, encoding = 'utf-8') as f:
+            texts = [author['description'] for author in json.load(f) if author and author.get('description')]
+    n = len(texts)
+    print('%d texts' % n)
+
+    reference = timed('clean(no_emoji=True)', lambda: [clean(text, no_emoji=True) for text in texts], 1, n)
+    fast = timed('fast_clean', lambda: [fast_clean(text) for text in texts], args.repeat, n)
+    timed('words_batch', lambda: words_batch(texts), args.repeat, n)
+
+    same_text = sum(a == b for a, b in zip(reference, fast))
+    same_words = sum(words(a) == words(b) for a, b in zip(reference, fast))
+    print('identical cleaned texts: %.2f%%' % (100.0 * same_text / n))
+    print('identical word lists:    %.2f%%' % (100.0 * same_words / n))
+
+    shown = 0
+    for text, a, b in zip(texts, reference, fast):
+        if a != b and shown < 5:
+            print('\n  raw:   %r\n  clean: %r\n  fast:  %r' % (text, a, b))
+            shown += 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding:utf-8 -*-
+
+# Note: Benchmarks of the collectors against `MockTwitterServer`, so they run offline and without spending API quota.
+# Usage: python bench_collector.py [--tweets 5000] [--latency 0.05] [--corpus bp.json]
+
+
+import argparse, json, time, tempfile
+
+from MockTwitterServer import MockTwitterServer, synthetic_tweets
+from TwitterCollector import TwitterCollector, TwitterStreamer
+from TweetSink import JsonlSink, load_collection
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print('%-45s %8.2f s' % (label, time.perf_counter() - start))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the Twitter collectors against a local mock of the API.')
+    parser.add_argument('--tweets', type = int, default = 5000, help = 'size of the synthetic corpus')
+    parser.add_argument('--corpus', default = None, help = 'a collection file such as bp.json to serve instead of a synthetic corpus')
+    parser.add_argument('--authors', default = 'author_info_list.json', help = 'the user objects to serve')
+    parser.add_argument('--latency', type = float, default = 0.05, help = 'seconds added to every response')
+    args = parser.parse_args()
+
+    with open(args.authors, encoding = 'utf-8') as f:
+        authors = [author for author in json.load(f) if author]
+    tweets = load_collection(args.corpus)['tweets'] if args.corpus else synthetic_tweets(authors, args.tweets)
+    author_ids = list(dict.fromkeys(tweet['author_id'] for tweet in tweets))
+    query = '"BORN PINK" -is:retweet lang:en'
+    print('corpus: %d tweets, %d authors, latency %.3f s' % (len(tweets), len(author_ids), args.latency))
+
+    # 1. pagination and author lookup
+    server = MockTwitterServer(tweets, authors, latency = args.latency).start()
+    with server.redirect():
+        tc = TwitterCollector('mock-token')
+        result = timed('fetch_recent_tweets (%d tweets)' % len(tweets)
+                       , lambda: tc.fetch_recent_tweets(query, tweets_cnt = len(tweets), save_result = False, keep_includes = True))
+        print('    %d tweets, %d authors from includes' % (result['tweet_cnt'], len(result['includes']['users'])))
+
+        sample = author_ids[:200]
+        timed('fetch_author_info loop (%d ids)' % len(sample), lambda: [tc.fetch_author_info(i) for i in sample])
+        result = timed('fetch_authors_info (%d ids)' % len(author_ids), lambda: tc.fetch_authors_info(author_ids))
+        print('    %d found, %d missing' % (len(result['authors']), len(result['missing'])))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = JsonlSink('bench', save_dir = tmp, compression = 'gzip')
+            timed('fetch_recent_tweets into a gzip JsonlSink'
+                  , lambda: tc.fetch_recent_tweets(query, tweets_cnt = len(tweets), sink = sink))
+    server.stop()
+
+    # 2. rate limits: 5 searches per 3 second window, the scheduler has to wait for the resets
+    server = MockTwitterServer(tweets, authors, latency = args.latency, rate_limits = {'search': 5}, window = 3).start()
+    with server.redirect():
+        tc = TwitterCollector(['mock-token-1', 'mock-token-2'])
+        timed('rate limited search (2 tokens, 15 pages)', lambda: tc.fetch_recent_tweets(query, tweets_cnt = 1500, save_result = False))
+        stats = tc.rate_limit_stats()
+        print('    requests %d, server 429s %d, scheduler waits %d (%.1f s)' % (stats['requests'], server.throttled, stats['waits'], stats['total_wait']))
+    server.stop()
+
+    # 3. filtered stream
+    server = MockTwitterServer(tweets, authors, stream_rate = 2000).start()
+    with server.redirect():
+        ts = TwitterStreamer('mock-token')
+        results = timed('stream 2 rules x 500 tweets'
+                        , lambda: ts.collect_tweets_stream_multi({'bornpink': '"BORN PINK"', 'lisa': 'lisa'}, tweets_cnt = 500
+                                                                , show_process = False, save_result = False))
+        print('    %s, %s' % ({tag: result['tweet_cnt'] for tag, result in results.items()}, ts.get_stats()))
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
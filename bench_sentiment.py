@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+
+# Note: Benchmark of the sentiment backends: `TextBlob(text).sentiment` one text at a time as in the analysis,
+# `SentimentEngine` with TextBlob on a process pool, and the vectorized `LexiconSentiment`, and the agreement of the
+# fast backend with TextBlob.
+# Usage: python bench_sentiment.py [--corpus bp.json] [--processes 4] [--repeat 3]
+# Without a corpus, the user descriptions of `author_info_list.json` are used as sample texts.
+
+
+import argparse, json, sys, time
+
+import numpy as np
+from textblob import TextBlob
+
+from LexiconSentiment import LexiconSentiment, agreement
+from SentimentEngine import SentimentEngine
+from TweetCleaner import fast_clean_batch
+from TweetSink import load_collection
+
+
+def timed(label, function, repeat, n):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    print('%-35s %8.3f s  %8.1f us/text' % (label, best, best / n * 1e6))
+    return result
+
+
+def textblob_serial(texts):
+    sentiments = [TextBlob(text).sentiment for text in texts]
+    result = {}
+    result['polarity'] = np.array([sentiment.polarity for sentiment in sentiments])
+    result['subjectivity'] = np.array([sentiment.subjectivity for sentiment in sentiments])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare the sentiment backends.')
+    parser.add_argument('--corpus', default = None, help = 'a collection file such as bp.json')
+    parser.add_argument('--authors', default = 'author_info_list.json', help = 'sample texts when no corpus is given')
+    parser.add_argument('--processes', type = int, default = None, help = 'worker processes of the TextBlob engine')
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--min-same-sign', type = float, default = 0.9, help = 'exit with an error below this share of equal polarity signs')
+    args = parser.parse_args()
+
+    if args.corpus:
+        raw = [tweet['text'] for tweet in load_collection(args.corpus)['tweets']]
+    else:
+        with open(args.authors, encoding = 'utf-8') as f:
+            raw = [author['description'] for author in json.load(f) if author and author.get('description')]
+    # the text scored in the analysis: cleaned, before the first link
+    texts = [cleaned.split('https')[0] for cleaned in fast_clean_batch(raw)]
+    n = len(texts)
+    print('%d texts' % n)
+
+    reference = timed('TextBlob, one by one', lambda: textblob_serial(texts), 1, n)
+    timed('SentimentEngine(textblob)', lambda: SentimentEngine(processes = args.processes).score(texts), 1, n)
+    lexicon = LexiconSentiment()
+    fast = timed('LexiconSentiment', lambda: lexicon.score(texts), args.repeat, n)
+
+    report = agreement(reference, fast)
+    for key, values in report.items():
+        print(key)
+        for name, value in values.items():
+            print('    %-18s %.4f' % (name, value))
+    print('mean polarity: TextBlob %.4f, fast %.4f' % (reference['polarity'].mean(), fast['polarity'].mean()))
+
+    if report['polarity']['same_sign'] < args.min_same_sign:
+        sys.exit('polarity sign agreement below %.0f%%' % (100 * args.min_same_sign))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# -*- coding:utf-8 -*-
+
+# Note: `TweetCleaner.fast_clean` must give exactly the output of `clean(text, no_emoji=True)`, so switching the
+# analysis to it does not change any count. Run with: python -m pytest test_cleaner.py
+
+
+import json, os
+
+import pytest
+
+cleantext = pytest.importorskip('cleantext')
+
+from TweetCleaner import fast_clean, fast_clean_batch
+
+
+AUTHORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'author_info_list.json')
+
+# texts exercising every step of the cleaning
+EDGE_CASES = [
+    'BORN PINK world tour 🖤💗 tickets https://t.co/AbC123',
+    '  Lisa   &amp; Jennie\n\n\n  on stage  ',
+    'fish &amp chips &amp; &lt;b&gt; <b>&amp;</b> &#39;quoted&#39; &NotAnEntity;',
+    '“Shut Down” is out now ‘today’ «oui» `tick´',
+    'Café Déjà vu… 😍😍 #BLACKPINK @ygofficialblink',
+    '𝕓𝕠𝕣𝕟 𝕡𝕚𝕟𝕜 𝒍𝒊𝒔𝒂',
+    'ＢＯＲＮ　ＰＩＮＫ ｜ （she／her） ！？',
+    'ﬁne Ĳssel',
+    'back\\nslash \\x41 \\u00e9 \\q //treasure\\\\',
+    'WTS 2 tix\r\nsec 101\r$150 each!!',
+    'a\x0cb\x1cc d e\x85f\x0bg﻿h',
+    'line one  \n  line two\t\ttabbed',
+    '现居美国洛杉矶，美籍华人，有跟必回！',
+    '',
+]
+
+# the known divergences: mojibake is repaired by ftfy inside clean-text, `fast_clean` leaves it as it is
+KNOWN_DIFFERENCES = [
+    'Ã©tÃ© mojibake',
+]
+
+
+def reference(text):
+    return cleantext.clean(text, no_emoji=True)
+
+
+@pytest.mark.parametrize('text', EDGE_CASES)
+def test_edge_cases(text):
+    assert fast_clean(text) == reference(text)
+
+
+def test_author_descriptions():
+    '''every description of the sample corpus is cleaned exactly like clean-text does'''
+    with open(AUTHORS_FILE, encoding = 'utf-8') as f:
+        texts = [author['description'] for author in json.load(f) if author and author.get('description')]
+    different = [text for text in texts if fast_clean(text) != reference(text)]
+    assert different == []
+
+
+@pytest.mark.parametrize('text', KNOWN_DIFFERENCES)
+def test_known_differences(text):
+    '''listed so that a change of either cleaner shows up here'''
+    assert fast_clean(text) != reference(text)
+
+
+def test_batch():
+    texts = EDGE_CASES + [None]
+    assert fast_clean_batch(texts) == [fast_clean(text) for text in texts]